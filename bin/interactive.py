@@ -12,6 +12,9 @@ if __name__ == '__main__':
     # parse arguments
     parser = argparse.ArgumentParser(description=None)
     parser.add_argument('-s', '--scenario', default='simple.py', help='Path of the scenario Python script.')
+    parser.add_argument('-w', '--world', nargs='+', metavar='KEY=VALUE',
+                        help='Keyword arguments of the scenario\'s make_world, e.g. num_receivers=5 k_nearest=4')
+    parser.add_argument('-r', '--record', help='Record the rendered frames to a directory of PNG files or a video file')
     parser.add_argument('-l', '--load_dir', help='Session load directory')
     args = parser.parse_args()
 
@@ -20,7 +23,7 @@ if __name__ == '__main__':
         # load scenario from script
         scenario = scenarios.load(args.scenario).Scenario()
         # create world
-        world = scenario.make_world()
+        world = scenario.make_world(**scenarios.world_kwargs(args.world))
         # create multiagent environment
         env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation, info_callback=None, shared_viewer = True)
         # render call to create viewer window (necessary only for interactive policies)
@@ -39,20 +42,25 @@ if __name__ == '__main__':
         # So now the session hosted by U.single_threaded_session SHOULD be loaded?
 
         obs_n = env.reset()
-        while True:
-            # query for action from each agent's policy
-            # act_n = []
-            # for i, policy in enumerate(policies):
-            #     act_n.append(policy.action(obs_n[i]))
-
-            act_n = [agent.action(obs) for agent, obs in zip(trainers,obs_n)]
-            # environment step
-            # new_obs_n, rew_n, done_n, info_n = env.step(action_n)
-
-            # step environment
-            obs_n, reward_n, done_n, _ = env.step(act_n)
-            # render all agent views
-            env.render_whole_field()
-            # display rewards
-            #for agent in env.world.agents:
-            #    print(agent.name + " reward: %0.3f" % env._get_reward(agent))
+        if args.record:
+            env.start_recording(args.record)
+        try:
+            while True:
+                # query for action from each agent's policy
+                # act_n = []
+                # for i, policy in enumerate(policies):
+                #     act_n.append(policy.action(obs_n[i]))
+
+                act_n = [agent.action(obs) for agent, obs in zip(trainers,obs_n)]
+                # environment step
+                # new_obs_n, rew_n, done_n, info_n = env.step(action_n)
+
+                # step environment
+                obs_n, reward_n, done_n, _ = env.step(act_n)
+                # render all agent views
+                env.render_whole_field()
+                # display rewards
+                #for agent in env.world.agents:
+                #    print(agent.name + " reward: %0.3f" % env._get_reward(agent))
+        finally:
+            env.stop_recording()
@@ -11,12 +11,15 @@ if __name__ == '__main__':
     # parse arguments
     parser = argparse.ArgumentParser(description=None)
     parser.add_argument('-s', '--scenario', default='simple.py', help='Path of the scenario Python script.')
+    parser.add_argument('-w', '--world', nargs='+', metavar='KEY=VALUE',
+                        help='Keyword arguments of the scenario\'s make_world, e.g. num_receivers=5 k_nearest=4')
+    parser.add_argument('-r', '--record', help='Record the rendered frames to a directory of PNG files or a video file')
     args = parser.parse_args()
 
     # load scenario from script
     scenario = scenarios.load(args.scenario).Scenario()
     # create world
-    world = scenario.make_world()
+    world = scenario.make_world(**scenarios.world_kwargs(args.world))
     # create multiagent environment
     env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation, info_callback=None, shared_viewer = False)
     # render call to create viewer window (necessary only for interactive policies)
@@ -26,15 +29,20 @@ if __name__ == '__main__':
     policies = [InteractivePolicy(env,i) for i in range(env.n)]
     # execution loop
     obs_n = env.reset()
-    while True:
-        # query for action from each agent's policy
-        act_n = []
-        for i, policy in enumerate(policies):
-            act_n.append(policy.action(obs_n[i]))
-        # step environment
-        obs_n, reward_n, done_n, _ = env.step(act_n)
-        # render all agent views
-        env.render()
-        # display rewards
-        #for agent in env.world.agents:
-        #    print(agent.name + " reward: %0.3f" % env._get_reward(agent))
+    if args.record:
+        env.start_recording(args.record)
+    try:
+        while True:
+            # query for action from each agent's policy
+            act_n = []
+            for i, policy in enumerate(policies):
+                act_n.append(policy.action(obs_n[i]))
+            # step environment
+            obs_n, reward_n, done_n, _ = env.step(act_n)
+            # render all agent views
+            env.render()
+            # display rewards
+            #for agent in env.world.agents:
+            #    print(agent.name + " reward: %0.3f" % env._get_reward(agent))
+    finally:
+        env.stop_recording()
@@ -3,6 +3,9 @@ Code for creating a multiagent environment with one of the scenarios listed
 in ./scenarios/.
 Can be called by using, for example:
     env = make_env('simple_speaker_listener')
+Keyword arguments of the scenario's make_world are passed through, e.g.
+    env = make_env('simple_passrush', **FULL_TEAMS)
+for 11-on-11 passrush teams (see scenarios/simple_passrush.py).
 After producing the env object, can be used similarly to an OpenAI gym
 environment.
 
@@ -12,7 +15,8 @@ of size (env.world.dim_p + env.world.dim_c, 1). Physical actions precede
 communication actions in this array. See environment.py for more details.
 """
 
-def make_env(scenario_name, benchmark=False):
+def make_env(scenario_name, benchmark=False, use_arrays=False, preallocate=False, headless=False,
+             **world_kwargs):
     '''
     Creates a MultiAgentEnv object as env. This can be used similar to a gym
     environment by calling env.reset() and env.step().
@@ -23,6 +27,14 @@ def make_env(scenario_name, benchmark=False):
                             (without the .py extension)
         benchmark       :   whether you want to produce benchmarking data
                             (usually only done during evaluation)
+        use_arrays      :   whether to step the physics on contiguous entity
+                            arrays (see World.use_arrays)
+        preallocate     :   whether step() and reset() return preallocated
+                            observation, reward and done arrays
+        headless        :   whether to render rgb_array frames with the NumPy
+                            rasterizer instead of an OpenGL window
+        world_kwargs    :   keyword arguments of the scenario's make_world
+                            (e.g. roster sizes or k_nearest)
 
     Some useful env properties (see environment.py):
         .observation_space  :   Returns the observation space for each agent
@@ -35,10 +47,16 @@ def make_env(scenario_name, benchmark=False):
     # load scenario from script
     scenario = scenarios.load(scenario_name + ".py").Scenario()
     # create world
-    world = scenario.make_world()
+    world = scenario.make_world(**world_kwargs)
+    world.use_arrays = use_arrays
     # create multiagent environment
+    observation_batch = getattr(scenario, 'observation_batch', None)
     if benchmark:        
-        env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation, scenario.benchmark_data)
+        env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation, scenario.benchmark_data,
+                            observation_batch_callback=observation_batch, preallocate=preallocate,
+                            headless=headless)
     else:
-        env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation)
+        env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation,
+                            observation_batch_callback=observation_batch, preallocate=preallocate,
+                            headless=headless)
     return env
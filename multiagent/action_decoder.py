@@ -0,0 +1,79 @@
+"""
+Action decoding for all agents of an environment at once. The layout of each
+agent's action (which segments carry the physical and communication action,
+and how wide they are) is worked out once from the environment's action
+spaces, and the actions of all agents are then turned into physical forces
+and utterances with a few array operations instead of one call per agent.
+"""
+import numpy as np
+
+class ActionDecoder(object):
+    def __init__(self, env):
+        world = env.world
+        self.dim_p = world.dim_p
+        self.dim_c = world.dim_c
+        self.discrete_action_input = env.discrete_action_input
+        self.discrete_action_space = env.discrete_action_space
+        self.force_discrete_action = env.force_discrete_action
+        self.n = len(env.agents)
+        # agents sharing movability and silence share the layout of their actions
+        groups = {}
+        for i, agent in enumerate(env.agents):
+            groups.setdefault((agent.movable, agent.silent), []).append(i)
+        self.groups = [(movable, silent, np.array(index, dtype=int)) for (movable, silent), index in groups.items()]
+        # actions of all agents fit in one (..., n, act_dim) array
+        self.uniform = len(self.groups) == 1
+
+    # width of the physical and communication segments of an action
+    def widths(self, movable, silent):
+        if self.discrete_action_input:
+            return int(movable), int(not silent)
+        u_width = self.dim_p * 2 + 1 if self.discrete_action_space else self.dim_p
+        return u_width * movable, self.dim_c * (not silent)
+
+    # physical actions (..., n, dim_p) and communication actions (..., n, dim_c)
+    # of all agents. actions is an (..., n, act_dim) array (or, for agents with
+    # different layouts, a list of per-agent actions) and sensitivity the
+    # (..., n) acceleration of each agent
+    def decode(self, actions, sensitivity):
+        if isinstance(actions, np.ndarray) or self.uniform:
+            actions = np.asarray(actions, dtype=float)
+            if self.discrete_action_input and actions.ndim == np.ndim(sensitivity):
+                actions = actions[..., None]
+            lead = actions.shape[:-2]
+        else:
+            lead = ()
+        u = np.zeros(lead + (self.n, self.dim_p))
+        c = np.zeros(lead + (self.n, self.dim_c))
+        for movable, silent, index in self.groups:
+            if isinstance(actions, np.ndarray):
+                action = actions[..., index, :]
+            else:
+                action = np.array([np.atleast_1d(actions[i]) for i in index], dtype=float)
+            u_width, c_width = self.widths(movable, silent)
+            if movable:
+                u[..., index, :] = self.decode_u(action[..., :u_width]) * sensitivity[..., index, None]
+            if not silent:
+                c[..., index, :] = self.decode_c(action[..., u_width:u_width + c_width])
+        return u, c
+
+    def decode_u(self, action):
+        if self.discrete_action_input:
+            # action index 2d + 1 pushes along -axis d, 2d + 2 along +axis d
+            action = self.one_hot(action[..., 0], self.dim_p * 2 + 1)
+            return action[..., 2::2] - action[..., 1::2]
+        if self.force_discrete_action:
+            action = self.one_hot(np.argmax(action, axis=-1), action.shape[-1])
+        if self.discrete_action_space:
+            # one-hot entry 2d + 1 pushes along +axis d, 2d + 2 along -axis d
+            return action[..., 1::2] - action[..., 2::2]
+        return action
+
+    def decode_c(self, action):
+        if self.discrete_action_input:
+            return self.one_hot(action[..., 0], self.dim_c)
+        return action
+
+    @staticmethod
+    def one_hot(index, width):
+        return (np.asarray(index, dtype=int)[..., None] == np.arange(width)).astype(float)
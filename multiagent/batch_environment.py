@@ -0,0 +1,229 @@
+import gym
+import numpy as np
+from multiagent import raster
+from multiagent.core import EntityArrays
+from multiagent.environment import MultiAgentEnv
+from multiagent.scenarios.constants import Q_BACK
+from multiagent.termination import PlayTermination, has_play, NOT_DONE
+
+# entity arrays of a whole batch of worlds, with a leading world axis
+class ArrayBatch(object):
+    def __init__(self, buffers):
+        self.__dict__.update(buffers)
+
+# batch of independent copies of one scenario stepped together: the state of
+# all worlds lives in (batch_size, n_entities, ...) arrays, so physics,
+# observations, rewards and dones are evaluated once for the whole batch.
+# Scenarios speed up the observation and reward with the optional
+# observation_batch(world, arrays, out, rows) and reward_batch(world, arrays) hooks,
+# otherwise their per-agent callbacks are used. Observations are written into
+# a (batch_size, n, obs_dim) float32 buffer, zero padded if observation sizes
+# differ and overwritten every step.
+class BatchedMultiAgentEnv(gym.Env):
+    metadata = {
+        'runtime.vectorized': True,
+        'render.modes' : ['human', 'rgb_array']
+    }
+
+    def __init__(self, scenario, batch_size, auto_reset=True):
+        self.scenario = scenario
+        self.batch_size = batch_size
+        self.auto_reset = auto_reset
+        self.worlds = [scenario.make_world() for _ in range(batch_size)]
+        # random number generator of batch-wide draws (noise, throw completion)
+        self.np_random = np.random.default_rng()
+        # template env of the first world provides the spaces and action decoding
+        self.env = MultiAgentEnv(self.worlds[0], scenario.reset_world, scenario.reward, scenario.observation)
+        self.n = self.env.n
+        self.shared_reward = self.env.shared_reward
+        obs_dim = max([space.shape[0] for space in self.env.observation_space])
+        self.obs_buf = np.zeros((batch_size, self.n, obs_dim), dtype=np.float32)
+
+        template = self.worlds[0]
+        self.arrays = ArrayBatch(EntityArrays.allocate(len(template.entities), len(template.agents),
+                                                       template.dim_p, template.dim_c, shape=(batch_size,)))
+        for k, world in enumerate(self.worlds):
+            world.use_arrays = True
+            world.arrays = EntityArrays(world, {name: buffer[k] for name, buffer in self.arrays.__dict__.items()})
+            world._arrays_stale = False
+        self.world_arrays = [world.arrays for world in self.worlds]
+        self.policy_agents = [world.policy_agents for world in self.worlds]
+        self.policy_index = np.array([i for i, agent in enumerate(template.agents) if agent.action_callback is None], dtype=int)
+
+        # outcome of the passrush play, if this scenario has one
+        self.termination = PlayTermination(template) if has_play(template) else None
+        self.has_play = self.termination is not None
+        self.time = np.zeros(batch_size, dtype=int)
+        self.line_of_scrimmage = np.zeros(batch_size)
+        self.first_down_line = np.zeros(batch_size)
+        self.timeout = np.full(batch_size, np.inf)
+        self.completion_percentage = np.zeros(batch_size)
+        for k in range(batch_size):
+            self._sync_world(k)
+        # batch renderers of full frames and minimaps, created on first use
+        self.renderers = {}
+
+    @property
+    def action_space(self):
+        return self.env.action_space
+
+    @property
+    def observation_space(self):
+        return self.env.observation_space
+
+    # action_n[k][i] is the action of policy agent i in world k
+    def step(self, action_n):
+        self._set_actions(action_n)
+        for world in self.worlds:
+            world.time += 1
+            for agent in world.scripted_agents:
+                agent.action = agent.action_callback(agent, world)
+        self.time += 1
+        self._step_physics()
+
+        obs_n = self._get_obs()
+        reward_n = self._get_reward()
+        done_n = self._get_done()
+        over = np.all(done_n != NOT_DONE, axis=1)
+        if self.has_play:
+            made_throw = self.np_random.uniform(0.0, 1.0, self.batch_size) < self.completion_percentage
+            reward_n = reward_n + self.termination.final_rewards(done_n, made_throw)
+        for k, i in np.argwhere(done_n != NOT_DONE):
+            self.policy_agents[k][i].is_done = True
+        if self.shared_reward:
+            reward_n = np.repeat(np.sum(reward_n, axis=1, keepdims=True), self.n, axis=1)
+
+        info_n = {'n': [], 'reset': over}
+        if self.auto_reset and over.any():
+            info_n['terminal_observation'] = obs_n[over]
+            for k in np.flatnonzero(over):
+                self._reset_world(k)
+            obs_n = self._get_obs()
+        return obs_n, reward_n, done_n, info_n
+
+    # decode the actions of all worlds straight into the batch arrays
+    def _set_actions(self, action_n):
+        arrays = self.arrays
+        index = self.policy_index
+        decoder = self.env.action_decoder
+        if decoder.uniform:
+            u, c = decoder.decode(np.asarray(action_n, dtype=float), arrays.sensitivity[:, index])
+        else:
+            decoded = [decoder.decode(actions, w.sensitivity[index]) for actions, w in zip(action_n, self.world_arrays)]
+            u, c = np.array([u for u, _ in decoded]), np.array([c for _, c in decoded])
+        arrays.u[:, index] = u
+        arrays.action_c[:, index] = c
+
+    # seed the batch and every world with independent streams derived from seed
+    def seed(self, seed=None):
+        seeds = np.random.SeedSequence(seed).spawn(self.batch_size + 1)
+        self.np_random = np.random.default_rng(seeds[0])
+        for world, world_seed in zip(self.worlds, seeds[1:]):
+            world.seed(world_seed)
+        return [seed]
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed(seed)
+        for k in range(self.batch_size):
+            self._reset_world(k)
+        return self._get_obs()
+
+    # 'rgb_array' renders all worlds into one (batch_size, H, W, 3) uint8 array
+    # (a buffer overwritten by the next call); minimap renders low resolution
+    # frames (one pixel per yard on the passrush field) e.g. for pixel
+    # observations. 'human' shows the first world.
+    def render(self, mode='rgb_array', minimap=False):
+        if mode == 'human':
+            if self.has_play:
+                return self.env.render_whole_field(mode)
+            return self.env.render(mode)
+        view, p_pos, radius, color, lines = raster.world_scene(self.worlds, self.arrays.p_pos)
+        if minimap not in self.renderers:
+            bounds, (width, height), _ = view
+            if minimap:
+                self.renderers[minimap] = raster.BatchRenderer(width // 7, height // 7, bounds,
+                                                               min_radius=0.75, outline=False)
+            else:
+                self.renderers[minimap] = raster.BatchRenderer(width, height, bounds)
+        return self.renderers[minimap].render(p_pos, radius, color, lines)
+
+    def _reset_world(self, k):
+        self.scenario.reset_world(self.worlds[k])
+        self.worlds[k].invalidate_arrays()
+        self._sync_world(k)
+
+    # re-read the properties and play parameters of world k after a reset
+    def _sync_world(self, k):
+        world = self.worlds[k]
+        world.sync_arrays()
+        self.time[k] = world.time
+        if self.has_play:
+            self.line_of_scrimmage[k] = world.line_of_scrimmage
+            self.first_down_line[k] = world.first_down_line
+            self.timeout[k] = world.timeout
+            self.completion_percentage[k] = world.roles.first(Q_BACK).completion_percentage
+
+    # advance all worlds with one vectorized physics step
+    def _step_physics(self):
+        world = self.worlds[0]
+        kernels = world.kernels
+        arrays = self.arrays
+        p_force = np.zeros_like(arrays.p_pos)
+        n = len(world.agents)
+        # scripted agents replace their action objects, so copy those in
+        for w in self.world_arrays:
+            for i, agent in w.scripted:
+                w.u[i] = agent.action.u
+                if agent.action.c is not None:
+                    w.action_c[i] = agent.action.c
+        noise = None
+        if arrays.u_noise.any():
+            noise = self.np_random.standard_normal((self.batch_size, n, world.dim_p))
+        kernels.apply_action_force(p_force, arrays.u, arrays.movable, noise, arrays.u_noise)
+        a, b = world.arrays.collision_pairs
+        kernels.apply_collision_force(p_force, arrays.p_pos, arrays.size, arrays.movable, a, b,
+                                      world.contact_force, world.contact_margin)
+        kernels.integrate_state(arrays.p_pos, arrays.p_vel, p_force, arrays.mass,
+                                arrays.max_speed, arrays.movable, world.damping, world.dt)
+        # communication state
+        arrays.c[arrays.silent] = 0.0
+        speakers = world.arrays.speaker_index
+        if len(speakers):
+            arrays.c[:, speakers] = arrays.action_c[:, speakers]
+            if arrays.c_noise[:, speakers].any():
+                noise = self.np_random.standard_normal((self.batch_size, len(speakers), world.dim_c))
+                arrays.c[:, speakers] += noise * arrays.c_noise[:, speakers, None]
+        # flag agents that left the field
+        if world.borders:
+            inside = kernels.in_bounds(arrays.p_pos[:, :n], world.borders)
+            arrays.in_bounds &= inside
+            for k, i in np.argwhere(~inside):
+                self.world_arrays[k].agents[i].in_bounds = False
+
+    # (batch_size, n, obs_dim) observations of all policy agents, written into obs_buf
+    def _get_obs(self):
+        if hasattr(self.scenario, 'observation_batch'):
+            self.scenario.observation_batch(self.worlds[0], self.arrays, out=self.obs_buf, rows=self.policy_index)
+            return self.obs_buf
+        for k, (world, agents) in enumerate(zip(self.worlds, self.policy_agents)):
+            for i, agent in enumerate(agents):
+                obs = self.scenario.observation(agent, world)
+                self.obs_buf[k, i, :len(obs)] = obs
+        return self.obs_buf
+
+    # (batch_size, n) rewards of all policy agents
+    def _get_reward(self):
+        if hasattr(self.scenario, 'reward_batch'):
+            return self.scenario.reward_batch(self.worlds[0], self.arrays)
+        return np.array([[self.scenario.reward(agent, world) for agent in agents]
+                         for world, agents in zip(self.worlds, self.policy_agents)], dtype=float)
+
+    # (batch_size, n) done codes of all policy agents (see termination.PlayTermination)
+    def _get_done(self):
+        if not self.has_play:
+            return np.zeros((self.batch_size, self.n), dtype=int)
+        arrays = self.arrays
+        n = len(self.worlds[0].agents)
+        return self.termination.done_codes(arrays.p_pos[:, :n], arrays.size[:, :n], arrays.in_bounds, self.time,
+                                           self.timeout, self.line_of_scrimmage, self.first_down_line)
@@ -0,0 +1,221 @@
+"""
+Benchmarks of the scenarios, physics backends and headless rendering. Every
+registered scenario (see scenarios.names()) is stepped with random actions
+under each backend (and, for scenarios that take a roster size, at several
+agent counts), measuring steps/sec, resets/sec, memory allocated per step,
+peak RSS and headless render frames/sec. Each configuration runs in a fresh
+process so its peak RSS is its own. The numba backend is skipped when Numba
+is not installed. Results are written as JSON and can be compared against a
+baseline from an earlier run:
+
+    python -m multiagent.benchmark -o results.json
+    python -m multiagent.benchmark -b results.json
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from multiagent.environment import MultiAgentEnv
+from multiagent.physics_numba import available as numba_available
+import multiagent.scenarios as scenarios
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# make_world keywords for a roster of about n agents, for scenarios that scale
+SCALING = {
+    'simple_spread': lambda n: {'num_agents': n},
+    # linemen on both sides of the quarterback
+    'simple_passrush': lambda n: {'num_offensive_linemen': (n - 1) // 2,
+                                  'num_defensive_linemen': n - 1 - (n - 1) // 2},
+}
+
+# environment configurations compared for every scenario
+BACKENDS = {
+    'objects': {'use_arrays': False},
+    'arrays': {'use_arrays': True},
+    'numba': {'use_arrays': True, 'physics_backend': 'numba'},
+    'preallocate': {'use_arrays': True, 'preallocate': True},
+}
+
+# measured quantities, and whether larger values are better
+METRICS = {
+    'steps_per_sec': True,
+    'resets_per_sec': True,
+    'alloc_kb_per_step': False,
+    'peak_rss_mb': False,
+    'render_fps': True,
+}
+
+def make_env(name, backend, n_agents=None, seed=0):
+    config = BACKENDS[backend]
+    scenario = scenarios.load(name).Scenario()
+    kwargs = {} if n_agents is None else SCALING[name](n_agents)
+    world = scenario.make_world(**kwargs)
+    world.use_arrays = config['use_arrays']
+    world.physics_backend = config.get('physics_backend', 'numpy')
+    env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation,
+                        observation_batch_callback=getattr(scenario, 'observation_batch', None),
+                        preallocate=config.get('preallocate', False), headless=True)
+    env.seed(seed)
+    return env
+
+# random actions for all agents, in the layout the action decoder expects
+def random_actions(env, rng):
+    decoder = env.action_decoder
+    actions = [rng.random(sum(decoder.widths(agent.movable, agent.silent))) for agent in env.agents]
+    return np.array(actions) if decoder.uniform else actions
+
+def peak_rss_mb():
+    if resource is None:
+        return float('nan')
+    # kilobytes on Linux, bytes on macOS
+    scale = 1.0 if sys.platform == 'darwin' else 1024.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+# measurements of one scenario/backend/roster configuration
+def run(name, backend, n_agents=None, steps=1000, episode_len=25, render_frames=20, seed=0):
+    rng = np.random.default_rng(seed)
+    env = make_env(name, backend, n_agents, seed)
+    env.reset()
+    actions = [random_actions(env, rng) for _ in range(episode_len)]
+    # warm up (compiles the numba kernels)
+    for action_n in actions[:2]:
+        env.step(action_n)
+
+    step_time = reset_time = 0.0
+    n_resets = 0
+    for t in range(steps):
+        if t % episode_len == 0:
+            start = time.perf_counter()
+            env.reset()
+            reset_time += time.perf_counter() - start
+            n_resets += 1
+        start = time.perf_counter()
+        env.step(actions[t % episode_len])
+        step_time += time.perf_counter() - start
+
+    # transient memory of a step, measured on a short separate run as tracing
+    # slows stepping down
+    tracemalloc.start()
+    alloc = []
+    for action_n in actions:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        env.step(action_n)
+        alloc.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    render_fps = float('nan')
+    if render_frames:
+        field = hasattr(env.world, 'first_down_line')
+        start = time.perf_counter()
+        for _ in range(render_frames):
+            if field:
+                env.render_whole_field('rgb_array')
+            else:
+                env.render('rgb_array')
+        render_fps = render_frames / (time.perf_counter() - start)
+
+    return {
+        'scenario': name,
+        'backend': backend,
+        'agents': len(env.world.agents),
+        'steps_per_sec': steps / step_time,
+        'resets_per_sec': n_resets / reset_time,
+        'alloc_kb_per_step': float(np.mean(alloc)) / 1024,
+        'peak_rss_mb': peak_rss_mb(),
+        'render_fps': render_fps,
+    }
+
+# run() in a fresh process, so that peak RSS (which never decreases within a
+# process) covers this configuration only
+def run_isolated(*args):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run, args)
+
+def key(result):
+    return result['scenario'], result['backend'], result['agents']
+
+# ratio of each metric to the baseline, flagging changes for the worse by
+# more than tolerance
+def compare(results, baseline, tolerance=0.1):
+    previous = {key(result): result for result in baseline['results']}
+    rows = []
+    for result in results['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if not old[metric] or np.isnan(old[metric]) or np.isnan(result[metric]):
+                continue
+            ratio = result[metric] / old[metric]
+            regression = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+            rows.append(key(result) + (metric, old[metric], result[metric], ratio, regression))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark scenarios, physics backends and rendering.')
+    parser.add_argument('-s', '--scenarios', nargs='+', default=None, help='Scenario names (default: all).')
+    parser.add_argument('-k', '--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('-a', '--agents', nargs='+', type=int, default=[3, 10, 30],
+                        help='Roster sizes of the scenarios that scale (see SCALING).')
+    parser.add_argument('-n', '--steps', type=int, default=1000)
+    parser.add_argument('-e', '--episode-len', type=int, default=25)
+    parser.add_argument('-f', '--render-frames', type=int, default=20, help='0 skips rendering.')
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+    parser.add_argument('-b', '--baseline', help='Compare against the results in this JSON file.')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1)
+    parser.add_argument('--in-process', action='store_true',
+                        help='Run all configurations in this process (peak RSS is then cumulative).')
+    args = parser.parse_args(argv)
+
+    backends = args.backends
+    if 'numba' in backends and not numba_available:
+        print('numba is not installed, skipping the numba backend', file=sys.stderr)
+        backends = [backend for backend in backends if backend != 'numba']
+    run_config = run if args.in_process else run_isolated
+
+    results = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'numba': numba_available,
+            'platform': platform.platform(),
+            'steps': args.steps,
+        },
+        'results': [],
+    }
+    for name in args.scenarios or scenarios.names():
+        rosters = args.agents if name in SCALING else [None]
+        for backend in backends:
+            for n_agents in rosters:
+                result = run_config(name, backend, n_agents, args.steps, args.episode_len, args.render_frames)
+                print('%-26s %-12s %5d  %9.1f steps/s %8.1f resets/s %8.1f kB/step %7.1f fps' % (
+                    name, backend, result['agents'], result['steps_per_sec'], result['resets_per_sec'],
+                    result['alloc_kb_per_step'], result['render_fps']))
+                results['results'].append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.tolerance)
+        for name, backend, agents, metric, old, new, ratio, regression in rows:
+            print('%-26s %-12s %5d %-18s %10.2f -> %10.2f (%5.2fx)%s' % (
+                name, backend, agents, metric, old, new, ratio, '  REGRESSION' if regression else ''))
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
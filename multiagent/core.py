@@ -1,8 +1,70 @@
 import numpy as np
+from multiagent import physics
+
+# state array that, once bound to a row of the world arrays, copies
+# assigned values into that row instead of replacing it
+class StateArray(object):
+    def __init__(self, name):
+        self.key = '_' + name
+
+    def __get__(self, state, owner=None):
+        if state is None:
+            return self
+        return state.__dict__.get(self.key)
+
+    def __set__(self, state, value):
+        row = state.__dict__.get(self.key)
+        if state.__dict__.get('bound', False):
+            if value is not row:
+                row[...] = value
+        else:
+            state.__dict__[self.key] = value
+
+# object whose array_fields can be stored in rows of the world arrays
+class ArrayBound(object):
+    # fields stored in the world arrays when the array backend is used
+    array_fields = ()
+
+    # make the given array rows the storage of this state
+    def bind(self, **rows):
+        for name, row in rows.items():
+            value = getattr(self, name)
+            if value is not None:
+                row[...] = value
+            self.__dict__['_' + name] = row
+        self.bound = True
+
+    # give this state back its own copy of every bound array
+    def unbind(self):
+        if not self.bound:
+            return
+        self.bound = False
+        for name in self.array_fields:
+            value = getattr(self, name)
+            if value is not None:
+                setattr(self, name, np.array(value))
+
+    # pickled states own their arrays; the world binds them again on its
+    # next step (rows of the world arrays would otherwise pickle as copies
+    # that still claim to be bound)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if state.get('bound', False):
+            state['bound'] = False
+            for name in self.array_fields:
+                if state.get('_' + name) is not None:
+                    state['_' + name] = np.array(state['_' + name])
+        return state
 
 # physical/external base state of all entites
-class EntityState(object):
+class EntityState(ArrayBound):
+    array_fields = ('p_pos', 'p_vel')
+    p_pos = StateArray('p_pos')
+    p_vel = StateArray('p_vel')
+
     def __init__(self):
+        # whether the state arrays are views into the world arrays
+        self.bound = False
         # physical position
         self.p_pos = None
         # physical velocity
@@ -10,14 +72,23 @@ class EntityState(object):
 
 # state of agents (including communication and internal/mental state)
 class AgentState(EntityState):
+    array_fields = EntityState.array_fields + ('c',)
+    c = StateArray('c')
+
     def __init__(self):
         super(AgentState, self).__init__()
         # communication utterance
         self.c = None
 
 # action of the agent
-class Action(object):
+class Action(ArrayBound):
+    array_fields = ('u', 'c')
+    u = StateArray('u')
+    c = StateArray('c')
+
     def __init__(self):
+        # whether the action arrays are views into the world arrays
+        self.bound = False
         # physical action
         self.u = None
         # communication action
@@ -77,6 +148,119 @@ class Agent(Entity):
         self.action = Action()
         # script behavior to execute
         self.action_callback = None
+        # still inside the world borders, and finished with the play
+        self.in_bounds = True
+        self.is_done = False
+
+# contiguous storage for the state and physical properties of all entities in
+# a world; agents occupy the leading rows, followed by the landmarks
+class EntityArrays(object):
+    def __init__(self, world, buffers=None):
+        self.entities = world.entities
+        self.agents = list(world.agents)
+        if buffers is None:
+            buffers = EntityArrays.allocate(len(self.entities), len(self.agents), world.dim_p, world.dim_c)
+        for name, buffer in buffers.items():
+            setattr(self, name, buffer)
+        self.bind()
+        self.refresh()
+
+    # allocate zeroed buffers, optionally with leading (batch) dimensions
+    @staticmethod
+    def allocate(n_entities, n_agents, dim_p, dim_c, shape=()):
+        shape = tuple(shape)
+        return {
+            # dynamic state
+            'p_pos': np.zeros(shape + (n_entities, dim_p)),
+            'p_vel': np.zeros(shape + (n_entities, dim_p)),
+            'c': np.zeros(shape + (n_agents, dim_c)),
+            'in_bounds': np.ones(shape + (n_agents,), dtype=bool),
+            # agent actions
+            'u': np.zeros(shape + (n_agents, dim_p)),
+            'action_c': np.zeros(shape + (n_agents, dim_c)),
+            # physical properties
+            'mass': np.ones(shape + (n_entities,)),
+            'size': np.zeros(shape + (n_entities,)),
+            'max_speed': np.full(shape + (n_entities,), np.inf),
+            'movable': np.zeros(shape + (n_entities,), dtype=bool),
+            'collide': np.zeros(shape + (n_entities,), dtype=bool),
+            # agent properties
+            'u_noise': np.zeros(shape + (n_agents,)),
+            'c_noise': np.zeros(shape + (n_agents,)),
+            'silent': np.zeros(shape + (n_agents,), dtype=bool),
+            'sensitivity': np.full(shape + (n_agents,), 5.0),
+        }
+
+    # point entity states at their rows of the arrays
+    def bind(self):
+        n_agents = len(self.agents)
+        for i, entity in enumerate(self.entities):
+            if i < n_agents:
+                entity.state.bind(p_pos=self.p_pos[i], p_vel=self.p_vel[i], c=self.c[i])
+                entity.action.bind(u=self.u[i], c=self.action_c[i])
+            else:
+                entity.state.bind(p_pos=self.p_pos[i], p_vel=self.p_vel[i])
+
+    def unbind(self):
+        for entity in self.entities:
+            entity.state.unbind()
+        for agent in self.agents:
+            agent.action.unbind()
+
+    # re-read physical properties (call after they change, e.g. on reset)
+    def refresh(self):
+        self.mass[...] = [entity.mass for entity in self.entities]
+        self.size[...] = [entity.size for entity in self.entities]
+        self.max_speed[...] = [np.inf if entity.max_speed is None else entity.max_speed for entity in self.entities]
+        self.movable[...] = [entity.movable for entity in self.entities]
+        self.collide[...] = [entity.collide for entity in self.entities]
+        self.u_noise[...] = [agent.u_noise or 0.0 for agent in self.agents]
+        self.c_noise[...] = [agent.c_noise or 0.0 for agent in self.agents]
+        self.silent[...] = [agent.silent for agent in self.agents]
+        self.in_bounds[...] = [getattr(agent, 'in_bounds', True) for agent in self.agents]
+        self.sensitivity[...] = [5.0 if agent.accel is None else agent.accel for agent in self.agents]
+        self.speakers = [(i, agent) for i, agent in enumerate(self.agents) if not agent.silent]
+        self.speaker_index = np.array([i for i, _ in self.speakers], dtype=int)
+        self.scripted = [(i, agent) for i, agent in enumerate(self.agents) if agent.action_callback is not None]
+        self.collision_pairs = physics.collision_pairs(self.collide)
+
+# agents of a world indexed by role and team, rebuilt only when the roster
+# changes (the returned lists are shared and must not be modified)
+class RoleIndex(object):
+    def __init__(self, world):
+        self.agents = world.agents
+        self.landmarks = world.landmarks
+        self.n_agents = len(self.agents)
+        self.n_landmarks = len(self.landmarks)
+        self.entities = self.agents + self.landmarks
+        self.policy_agents = [agent for agent in self.agents if agent.action_callback is None]
+        self.scripted_agents = [agent for agent in self.agents if agent.action_callback is not None]
+        self.adversaries = [agent for agent in self.agents if getattr(agent, 'adversary', False)]
+        self.good_agents = [agent for agent in self.agents if not getattr(agent, 'adversary', False)]
+        self.leaders = [agent for agent in self.agents if getattr(agent, 'leader', False)]
+        # indices of the agents playing each position (e.g. passrush roles)
+        self.position_index = {}
+        for i, agent in enumerate(self.agents):
+            self.position_index.setdefault(getattr(agent, 'position', None), []).append(i)
+        self.position_index = {p: np.array(index, dtype=int) for p, index in self.position_index.items()}
+        self.by_position = {p: [self.agents[i] for i in index] for p, index in self.position_index.items()}
+
+    # whether the roster of the world is still the one indexed
+    def matches(self, world):
+        return (world.agents is self.agents and len(world.agents) == self.n_agents and
+                world.landmarks is self.landmarks and len(world.landmarks) == self.n_landmarks)
+
+    # agents playing the given position
+    def position(self, position):
+        return self.by_position.get(position, [])
+
+    # indices (into world.agents) of the agents playing the given position
+    def index(self, position):
+        return self.position_index.get(position, np.zeros(0, dtype=int))
+
+    # the first agent playing the given position
+    def first(self, position):
+        return self.by_position[position][0]
 
 # multi-agent world
 class World(object):
@@ -98,52 +282,310 @@ class World(object):
         self.contact_force = 1e+2
         self.contact_margin = 1e-3
         self.time = 0
+        # random number generator of the world (see seed())
+        self.np_random = np.random.default_rng()
 
         self.borders = [] # x/y of border rectangle
         self.line_of_scrimmage = 50 #number between 10 and 110
 
+        # cached role index of the agents
+        self._roles = None
+
+        # step the physics on contiguous entity arrays instead of per entity
+        self.use_arrays = False
+        self.arrays = None
+        self._arrays_stale = True
+        # only evaluate contacts between entities closer than their sizes plus
+        # a cutoff (defaults to 40 contact margins, beyond which the force vanishes)
+        self.broadphase = False
+        self.broadphase_cutoff = None
+        # compare broadphase forces against the exact all-pairs result
+        self.broadphase_check = False
+        # kernels stepping the entity arrays: 'numpy' or 'numba' (compiled,
+        # falls back to 'numpy' when numba is not installed)
+        self.physics_backend = 'numpy'
+        # profiling.Profiler receiving the time of each physics phase (if any)
+        self.profiler = None
+        # spatial index of the agent positions (see neighbor_index())
+        self._neighbor_index = None
+
+    # the entity arrays and spatial index are rebuilt after unpickling
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['arrays'] = None
+        state['_arrays_stale'] = True
+        state['_neighbor_index'] = None
+        return state
+
+    # reseed the random number generator of the world; seed may be an int, a
+    # np.random.SeedSequence or None for fresh entropy
+    def seed(self, seed=None):
+        self.np_random = np.random.default_rng(seed)
+        return seed
+
+    # play parameters included in state snapshots (nan when not set)
+    state_scalars = ('time', 'line_of_scrimmage', 'first_down_line', 'timeout')
+
+    # flat float64 snapshot of all dynamic state: entity positions and
+    # velocities, agent communication, the in_bounds, is_done and
+    # completion_percentage of every agent, the play parameters and the state
+    # of the random number generator (its 64 bit words stored bit for bit)
+    def get_state(self):
+        if self.use_arrays:
+            arrays = self.sync_arrays()
+            p_pos, p_vel, c = arrays.p_pos, arrays.p_vel, arrays.c
+        else:
+            zeros_p, zeros_c = np.zeros(self.dim_p), np.zeros(self.dim_c)
+            p_pos = [entity.state.p_pos for entity in self.entities]
+            p_vel = [zeros_p if entity.state.p_vel is None else entity.state.p_vel for entity in self.entities]
+            c = [zeros_c if agent.state.c is None else agent.state.c for agent in self.agents]
+        flags = [[getattr(agent, 'in_bounds', True), getattr(agent, 'is_done', False),
+                  getattr(agent, 'completion_percentage', np.nan)] for agent in self.agents]
+        scalars = [getattr(self, name, np.nan) for name in self.state_scalars]
+        return np.concatenate([np.ravel(p_pos), np.ravel(p_vel), np.ravel(c), np.ravel(np.array(flags, dtype=float)),
+                               np.array(scalars, dtype=float), self._rng_words().view(np.float64)])
+
+    # restore a snapshot taken by get_state() of this world in place
+    def set_state(self, state):
+        n_entities, n_agents = len(self.entities), len(self.agents)
+        sizes = [n_entities * self.dim_p, n_entities * self.dim_p, n_agents * self.dim_c,
+                 n_agents * 3, len(self.state_scalars), 6]
+        assert len(state) == sum(sizes), 'state was taken from a different roster'
+        p_pos, p_vel, c, flags, scalars, words = np.split(np.asarray(state, dtype=float), np.cumsum(sizes)[:-1])
+        p_pos = p_pos.reshape((n_entities, self.dim_p))
+        p_vel = p_vel.reshape((n_entities, self.dim_p))
+        c = c.reshape((n_agents, self.dim_c))
+        flags = flags.reshape((n_agents, 3))
+        if self.use_arrays:
+            # entity states are bound to the arrays
+            arrays = self.sync_arrays()
+            arrays.p_pos[...] = p_pos
+            arrays.p_vel[...] = p_vel
+            arrays.c[...] = c
+            arrays.in_bounds[...] = flags[:, 0] > 0
+        else:
+            for i, entity in enumerate(self.entities):
+                entity.state.p_pos = p_pos[i].copy()
+                entity.state.p_vel = p_vel[i].copy()
+            for i, agent in enumerate(self.agents):
+                agent.state.c = c[i].copy()
+        for agent, (in_bounds, is_done, completion_percentage) in zip(self.agents, flags):
+            agent.in_bounds = bool(in_bounds)
+            agent.is_done = bool(is_done)
+            if not np.isnan(completion_percentage):
+                agent.completion_percentage = completion_percentage
+        for name, value in zip(self.state_scalars, scalars):
+            if not np.isnan(value):
+                setattr(self, name, int(value) if name == 'time' else float(value))
+        self._set_rng_words(np.array(words).view(np.uint64))
+
+    # state of the (PCG64) random number generator as six 64 bit words
+    def _rng_words(self):
+        state = self.np_random.bit_generator.state
+        assert state['bit_generator'] == 'PCG64', 'snapshots need a PCG64 generator'
+        mask = (1 << 64) - 1
+        words = []
+        for value in (state['state']['state'], state['state']['inc']):
+            words += [value & mask, value >> 64]
+        return np.array(words + [state['has_uint32'], state['uinteger']], dtype=np.uint64)
+
+    def _set_rng_words(self, words):
+        words = [int(w) for w in words]
+        self.np_random.bit_generator.state = {
+            'bit_generator': 'PCG64',
+            'state': {'state': words[0] | words[1] << 64, 'inc': words[2] | words[3] << 64},
+            'has_uint32': words[4],
+            'uinteger': words[5],
+        }
+
+    # return the role index of the agents, rebuilt if the roster changed
+    @property
+    def roles(self):
+        if self._roles is None or not self._roles.matches(self):
+            self._roles = RoleIndex(self)
+        return self._roles
+
+    # rebuild the role index on next use (call after changing agents in place,
+    # e.g. their action_callback)
+    def invalidate_roster(self):
+        self._roles = None
+
     # return all entities in the world
     @property
     def entities(self):
-        return self.agents + self.landmarks
+        return self.roles.entities
 
     # return all agents controllable by external policies
     @property
     def policy_agents(self):
-        return [agent for agent in self.agents if agent.action_callback is None]
+        return self.roles.policy_agents
 
     # return all agents controlled by world scripts
     @property
     def scripted_agents(self):
-        return [agent for agent in self.agents if agent.action_callback is not None]
+        return self.roles.scripted_agents
 
     # update state of the world
     def step(self):
+        prof = self.profiler
+        if prof is not None: t = prof.clock()
         self.time += 1
         # print("time", self.time)
         # set actions for scripted agents 
         for agent in self.scripted_agents:
             agent.action = agent.action_callback(agent, self)
+        if prof is not None: prof.lap('scripted', t)
+        if self.use_arrays:
+            self.step_arrays()
+            return
+        if prof is not None: t = prof.clock()
         # gather forces applied to entities
         # print("num entities", len(self.entities))
         p_force = [None] * len(self.entities)
         # apply agent physical controls
         p_force = self.apply_action_force(p_force)
+        if prof is not None: t = prof.lap('action_force', t)
         # apply environment forces
         p_force = self.apply_environment_force(p_force)
+        if prof is not None: t = prof.lap('collision_force', t)
         # integrate physical state
         self.integrate_state(p_force)
+        if prof is not None: t = prof.lap('integrate', t)
         # update agent state
+        noise = self.comm_noise()
+        speaker = 0
         for agent in self.agents:
-            self.update_agent_state(agent)
+            self.update_agent_state(agent, None if noise is None or agent.silent else noise[speaker])
+            speaker += not agent.silent
+        if prof is not None: prof.lap('agent_state', t)
+
+    # mark the entity arrays for a refresh of physical properties
+    def invalidate_arrays(self):
+        self._arrays_stale = True
+
+    # return the entity arrays, (re)building them if the roster changed
+    def sync_arrays(self):
+        entities = self.entities
+        if self.arrays is None or self.arrays.entities != entities:
+            if self.arrays is not None:
+                self.arrays.unbind()
+            self.arrays = EntityArrays(self)
+        elif self._arrays_stale:
+            self.arrays.refresh()
+        self._arrays_stale = False
+        return self.arrays
+
+    # module with the physics kernels of the selected backend
+    @property
+    def kernels(self):
+        if self.physics_backend == 'numba':
+            from multiagent import physics_numba
+            return physics_numba
+        assert self.physics_backend == 'numpy', 'unknown physics backend %r' % self.physics_backend
+        return physics
+
+    # update state of the world with vectorized operations on the entity arrays
+    def step_arrays(self):
+        prof = self.profiler
+        if prof is not None: t = prof.clock()
+        arrays = self.sync_arrays()
+        p_force = self.apply_action_force_arrays(arrays)
+        if prof is not None: t = prof.lap('action_force', t)
+        p_force = self.apply_environment_force_arrays(arrays, p_force)
+        if prof is not None: t = prof.lap('collision_force', t)
+        self.kernels.integrate_state(arrays.p_pos, arrays.p_vel, p_force, arrays.mass,
+                                     arrays.max_speed, arrays.movable, self.damping, self.dt)
+        if prof is not None: t = prof.lap('integrate', t)
+        self.update_agent_state_arrays(arrays)
+        if prof is not None: prof.lap('agent_state', t)
+
+    # gather agent action forces into an (n_entities, dim_p) array
+    def apply_action_force_arrays(self, arrays):
+        p_force = np.zeros_like(arrays.p_pos)
+        n = len(arrays.agents)
+        if n == 0:
+            return p_force
+        # scripted agents replace their action objects, so copy those in
+        for i, agent in arrays.scripted:
+            arrays.u[i] = agent.action.u
+            if agent.action.c is not None:
+                arrays.action_c[i] = agent.action.c
+        noise = None
+        if arrays.u_noise.any():
+            noise = self.np_random.standard_normal((n, self.dim_p))
+        return self.kernels.apply_action_force(p_force, arrays.u, arrays.movable, noise, arrays.u_noise)
+
+    # add collision forces of all colliding pairs to the (n_entities, dim_p) force array
+    def apply_environment_force_arrays(self, arrays, p_force):
+        kernels = self.kernels
+        if not self.broadphase:
+            a, b = arrays.collision_pairs
+            return kernels.apply_collision_force(p_force, arrays.p_pos, arrays.size, arrays.movable, a, b,
+                                                 self.contact_force, self.contact_margin)
+        cutoff = self.broadphase_cutoff
+        if cutoff is None:
+            cutoff = 40 * self.contact_margin
+        if self.broadphase_check:
+            a, b = arrays.collision_pairs
+            exact = physics.apply_collision_force(p_force.copy(), arrays.p_pos, arrays.size, arrays.movable, a, b,
+                                                  self.contact_force, self.contact_margin)
+        a, b = physics.broadphase_pairs(arrays.p_pos, arrays.size, arrays.collide, cutoff, self.sweep_axis())
+        p_force = kernels.apply_collision_force(p_force, arrays.p_pos, arrays.size, arrays.movable, a, b,
+                                                self.contact_force, self.contact_margin)
+        if self.broadphase_check:
+            n_pruned = len(arrays.collision_pairs[0]) - len(a)
+            atol = n_pruned * physics.collision_force_bound(cutoff, self.contact_force, self.contact_margin)
+            assert np.allclose(p_force, exact, rtol=1e-9, atol=atol), 'broadphase forces differ from all-pairs forces'
+        return p_force
+
+    # spatial.NeighborIndex of the agent positions for k nearest neighbor and
+    # radius queries, built once per step and shared by all queries until
+    # the agents move
+    def neighbor_index(self):
+        from multiagent.spatial import NeighborIndex
+        if self.use_arrays:
+            p_pos = self.sync_arrays().p_pos[:len(self.agents)]
+        else:
+            p_pos = np.array([agent.state.p_pos for agent in self.agents]).reshape((len(self.agents), self.dim_p))
+        index = self._neighbor_index
+        if index is None or not np.array_equal(index.points, p_pos):
+            index = self._neighbor_index = NeighborIndex(p_pos)
+        return index
+
+    # axis along which the broadphase sweeps (the longer side of the borders)
+    def sweep_axis(self):
+        if not self.borders:
+            return 0
+        extent = np.subtract(self.borders[1], self.borders[0])
+        return int(np.argmax(extent))
+
+    def update_agent_state_arrays(self, arrays):
+        # set communication state (directly for now)
+        arrays.c[arrays.silent] = 0.0
+        speakers = arrays.speaker_index
+        if len(speakers):
+            arrays.c[speakers] = arrays.action_c[speakers]
+            if arrays.c_noise[speakers].any():
+                noise = self.np_random.standard_normal((len(speakers), self.dim_c))
+                arrays.c[speakers] += noise * arrays.c_noise[speakers, None]
+        # flag agents that left the field
+        if self.borders:
+            n = len(arrays.agents)
+            inside = self.kernels.in_bounds(arrays.p_pos[:n], self.borders)
+            arrays.in_bounds &= inside
+            for i in np.flatnonzero(~inside):
+                arrays.agents[i].in_bounds = False
 
     # gather agent action forces
     def apply_action_force(self, p_force):
+        # motor noise of all agents is drawn at once
+        noise = None
+        if any(agent.u_noise for agent in self.agents):
+            noise = self.np_random.standard_normal((len(self.agents), self.dim_p))
         # set applied forces
         for i,agent in enumerate(self.agents):
             if agent.movable:
-                noise = np.random.randn(*agent.action.u.shape) * agent.u_noise if agent.u_noise else 0.0
-                p_force[i] = agent.action.u + noise                
+                p_force[i] = agent.action.u + (noise[i] * agent.u_noise if agent.u_noise else 0.0)
         return p_force
 
     # gather physical forces acting on entities
@@ -171,19 +613,30 @@ class World(object):
             if entity.max_speed is not None:
                 speed = np.sqrt(np.square(entity.state.p_vel[0]) + np.square(entity.state.p_vel[1]))
                 if speed > entity.max_speed:
-                    entity.state.p_vel = entity.state.p_vel / np.sqrt(np.square(entity.state.p_vel[0]) +
-                                                                  np.square(entity.state.p_vel[1])) * entity.max_speed
+                    entity.state.p_vel = entity.state.p_vel / speed * entity.max_speed
             entity.state.p_pos += entity.state.p_vel * self.dt
 
-    def update_agent_state(self, agent):
+    # communication noise of all speaking agents, drawn at once in agent order
+    # (as update_agent_state_arrays does), or None if none of them is noisy
+    def comm_noise(self):
+        speakers = [agent for agent in self.agents if not agent.silent]
+        if not any(agent.c_noise for agent in speakers):
+            return None
+        return self.np_random.standard_normal((len(speakers), self.dim_c))
+
+    # noise is the agent's row of comm_noise(); drawn here if not given
+    def update_agent_state(self, agent, noise=None):
         # set communication state (directly for now)
         if agent.silent:
             agent.state.c = np.zeros(self.dim_c)
         else:
-            noise = np.random.randn(*agent.action.c.shape) * agent.c_noise if agent.c_noise else 0.0
-            agent.state.c = agent.action.c + noise
+            if agent.c_noise and noise is None:
+                noise = self.np_random.standard_normal(agent.action.c.shape)
+            agent.state.c = agent.action.c + (noise * agent.c_noise if agent.c_noise else 0.0)
 
         # Set agent to out of bounds???
+        if not self.borders:
+            return
         position = agent.state.p_pos
         position_x = position[0]
         position_y = position[1]
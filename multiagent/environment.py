@@ -2,15 +2,11 @@ import gym
 from gym import spaces
 from gym.envs.registration import EnvSpec
 import numpy as np
+from multiagent.action_decoder import ActionDecoder
 from multiagent.multi_discrete import MultiDiscrete
-from multiagent.scenarios.constants import D_LINE, O_LINE, Q_BACK
-
-NOT_DONE = 0
-Q_BACK_FIRST_DOWN_LINE = 1
-AGENT_OUT_OF_BOUNDS = 2
-D_LINE_REACHED_Q_BACK = 3
-Q_BACK_NOT_IN_BOUNDS = 4
-Q_BACK_THREW_BALL = 5
+from multiagent.scenarios.constants import Q_BACK, OFFENSE
+from multiagent.termination import PlayTermination, has_play, FINAL_REWARD, NOT_DONE, Q_BACK_FIRST_DOWN_LINE, \
+    AGENT_OUT_OF_BOUNDS, D_LINE_REACHED_Q_BACK, Q_BACK_NOT_IN_BOUNDS, Q_BACK_THREW_BALL
 
 # environment for all agents in the multiagent world
 # currently code assumes that no agents will be created/destroyed at runtime!
@@ -21,7 +17,8 @@ class MultiAgentEnv(gym.Env):
 
     def __init__(self, world, reset_callback=None, reward_callback=None,
                  observation_callback=None, info_callback=None,
-                 done_callback=None, shared_viewer=True):
+                 done_callback=None, shared_viewer=True,
+                 observation_batch_callback=None, preallocate=False, headless=False):
 
         self.world = world
         self.agents = self.world.policy_agents
@@ -32,6 +29,8 @@ class MultiAgentEnv(gym.Env):
         self.reward_callback = reward_callback
         self.observation_callback = observation_callback
         self.info_callback = info_callback
+        # optional scenario callback building all observations from the entity arrays
+        self.observation_batch_callback = observation_batch_callback
         # self.done_callback = _done_callback
         # environment parameters
         self.discrete_action_space = True
@@ -42,6 +41,8 @@ class MultiAgentEnv(gym.Env):
         # if true, every agent has the same reward
         self.shared_reward = world.collaborative if hasattr(world, 'collaborative') else False
         self.time = 0
+        # play-level done codes and final rewards (passrush scenarios only)
+        self.termination = PlayTermination(world) if has_play(world) else None
 
         # configure spaces
         self.action_space = []
@@ -55,12 +56,12 @@ class MultiAgentEnv(gym.Env):
                 u_action_space = spaces.Box(low=-agent.u_range, high=+agent.u_range, shape=(world.dim_p,), dtype=np.float32)
             if agent.movable:
                 total_action_space.append(u_action_space)
-            # communication action space
-            if self.discrete_action_space:
-                c_action_space = spaces.Discrete(world.dim_c)
-            else:
-                c_action_space = spaces.Box(low=0.0, high=1.0, shape=(world.dim_c,), dtype=np.float32)
+            # communication action space (silent agents have none, and dim_c may be 0)
             if not agent.silent:
+                if self.discrete_action_space:
+                    c_action_space = spaces.Discrete(world.dim_c)
+                else:
+                    c_action_space = spaces.Box(low=0.0, high=1.0, shape=(world.dim_c,), dtype=np.float32)
                 total_action_space.append(c_action_space)
             # total action space
             if len(total_action_space) > 1:
@@ -76,11 +77,34 @@ class MultiAgentEnv(gym.Env):
             obs_dim = len(observation_callback(agent, self.world))
             self.observation_space.append(spaces.Box(low=-np.inf, high=+np.inf, shape=(obs_dim,), dtype=np.float32))
             agent.action.c = np.zeros(self.world.dim_c)
+        # decodes the actions of all agents at once
+        self.action_decoder = ActionDecoder(self)
+        # rows of the policy agents in the world arrays
+        self.policy_index = np.array([i for i, agent in enumerate(world.agents) if agent.action_callback is None], dtype=int)
+
+        # if true, step() and reset() fill and return preallocated arrays: a
+        # (n, obs_dim) float32 observation buffer (zero padded if observation
+        # sizes differ) and (n,) reward and done buffers, overwritten every step
+        self.preallocate = preallocate
+        if self.preallocate:
+            obs_dim = max([space.shape[0] for space in self.observation_space])
+            self.obs_buf = np.zeros((self.n, obs_dim), dtype=np.float32)
+            self.reward_buf = np.zeros(self.n)
+            self.done_buf = np.zeros(self.n, dtype=int)
 
         # rendering
         self.shared_viewer = shared_viewer
+        # if true, frames are rasterized with NumPy instead of OpenGL (see raster.py)
+        self.headless = headless
+        # recording.Recorder receiving every rendered frame, if recording
+        self.recorder = None
+        # trajectory.TrajectoryWriter receiving the state after every step, if logging
+        self.trajectory = None
+        # profiling.Profiler receiving the time of each phase of a step, if profiling
+        self.profiler = None
         if self.shared_viewer:
             self.viewer = None
+            self.viewers = [None]
         else:
             self.viewers = [None] * self.n
         self._reset_render()
@@ -89,6 +113,8 @@ class MultiAgentEnv(gym.Env):
         return [agent if not agent.is_done else None for agent in self.agents]
 
     def step(self, action_n):
+        prof = self.profiler
+        if prof is not None: start = t = prof.clock()
         obs_n = []
         reward_n = []
         done_n = []
@@ -96,20 +122,38 @@ class MultiAgentEnv(gym.Env):
         self.agents = self.world.policy_agents
         # print(self.agents)
         # set action for each agent
-        for i, agent in enumerate(self.agents):
-            self._set_action(action_n[i], agent, self.action_space[i])
+        self._set_actions(action_n)
+        if prof is not None: prof.lap('set_actions', t)
         # advance world state
         self.world.step()
         # record observation for each agent
         # print("New step")
 
-        chance_of_completion = np.random.uniform(0.0, 1.0)
-        made_throw = chance_of_completion < list(filter(lambda player: player.position == 'q_back', self.world.agents))[0].completion_percentage
-
-        for agent in self.agents:
-            obs_n.append(self._get_obs(agent))
+        if prof is not None: t = prof.clock()
+        # evaluate the outcome of the play once for all agents
+        if self.termination is not None:
+            chance_of_completion = self.world.np_random.uniform(0.0, 1.0)
+            made_throw = chance_of_completion < self.world.roles.first(Q_BACK).completion_percentage
+            codes = self.termination.world_done_codes(self.world)
+            final_reward = self.termination.final_rewards(codes, made_throw)
+        else:
+            codes = np.zeros(self.n, dtype=int)
+        if prof is not None: t = prof.lap('done', t)
+
+        batch_obs = self.observation_batch_callback is not None and self.world.use_arrays
+        if self.preallocate:
+            self._fill_obs()
+        elif batch_obs:
+            obs_n = list(self.observation_batch_callback(self.world, self.world.sync_arrays(),
+                                                         rows=self.policy_index))
+        if prof is not None: t = prof.lap('observation', t)
+        for i, agent in enumerate(self.agents):
+            if not self.preallocate and not batch_obs:
+                obs_n.append(self._get_obs(agent))
+                if prof is not None: t = prof.lap('observation', t)
             reward = self._get_reward(agent)
-            is_done = self.done_callback(agent, self.world)
+            if prof is not None: t = prof.lap('reward', t)
+            is_done = int(codes[i])
             done_n.append(is_done)
             # TODO: 
             # If done, I need to somehow indicate that so that no more actions are taken...
@@ -121,65 +165,92 @@ class MultiAgentEnv(gym.Env):
                 # print("agent position", agent.position)
                 # print(agent.state.p_pos)
 
-                additional_reward = self.get_final_reward(is_done, agent, made_throw)
+                additional_reward = int(final_reward[i])
 
                 # print("additional_reward", additional_reward)
                 reward = reward + additional_reward
 
             reward_n.append(reward)
+            if prof is not None: t = prof.lap('done', t)
             info_n['n'].append(self._get_info(agent))
+            if prof is not None: t = prof.lap('info', t)
 
         # all agents get total reward in cooperative case
         reward = np.sum(reward_n)
         if self.shared_reward:
             reward_n = [reward] * self.n
 
+        if self.trajectory is not None:
+            self.trajectory.write(self.world, done_n)
+        if prof is not None:
+            prof.lap('step', start)
+            prof.commit()
+
+        if self.preallocate:
+            self.reward_buf[:] = reward_n
+            self.done_buf[:] = done_n
+            return self.obs_buf, self.reward_buf, self.done_buf, info_n
         return obs_n, reward_n, done_n, info_n
 
 
 
+    # final reward of a single agent (see termination.FINAL_REWARD)
     def get_final_reward(self, is_done, agent, made_throw):
-        # print(is_done, Q_BACK_NOT_IN_BOUNDS)
-
-        if (is_done == Q_BACK_FIRST_DOWN_LINE):
-            if (agent.position == O_LINE) or (agent.position == Q_BACK):
-                return 120
-            else:
-                return -120
-        elif (is_done == AGENT_OUT_OF_BOUNDS):
-            return -80
-        elif (is_done == D_LINE_REACHED_Q_BACK):
-            if (agent.position == O_LINE) or (agent.position == Q_BACK):
-                return -120 # TODO 
-            else:
-                return 120
-        elif is_done == Q_BACK_NOT_IN_BOUNDS:
-            if (agent.position == O_LINE) or (agent.position == Q_BACK):
-                return -80
-            else:
-                return 80
-        elif is_done == Q_BACK_THREW_BALL:
-            if (agent.position == O_LINE) or (agent.position == Q_BACK):
-                return 80 if made_throw else -80
-            else:
-                return -80 if made_throw else 80
-
-
-    def reset(self):
+        if is_done == NOT_DONE:
+            return None
+        reward = int(FINAL_REWARD[is_done, int(agent.position in OFFENSE)])
+        return -reward if (is_done == Q_BACK_THREW_BALL and made_throw) else reward
+
+
+    # seed the random number generators of the world and of the action
+    # spaces with independent streams derived from seed
+    def seed(self, seed=None):
+        seeds = np.random.SeedSequence(seed).spawn(len(self.action_space) + 1)
+        self.world.seed(seeds[0])
+        for space, space_seed in zip(self.action_space, seeds[1:]):
+            if hasattr(space, 'seed'):
+                space.seed(int(space_seed.generate_state(1)[0]))
+        return [seed]
+
+    def reset(self, seed=None):
+        prof = self.profiler
+        if prof is not None: start = prof.clock()
+        if seed is not None:
+            self.seed(seed)
         # reset world
         self.reset_callback(self.world)
+        if prof is not None: prof.lap('reset_callback', start)
+        self.world.invalidate_roster()
+        self.world.invalidate_arrays()
         # reset renderer
         self._reset_render()
+        if self.trajectory is not None:
+            self.trajectory.write(self.world, np.zeros(self.n, dtype=int), reset=True)
         # record observations for each agent
         obs_n = []
         self.agents = self.world.policy_agents
-        for agent in self.get_agents():
-            obs = None
-            if agent:
-                obs = self._get_obs(agent)
-            obs_n.append(obs)
+        if self.preallocate:
+            self._fill_obs()
+            obs_n = self.obs_buf
+        else:
+            for agent in self.get_agents():
+                obs = None
+                if agent:
+                    obs = self._get_obs(agent)
+                obs_n.append(obs)
+        if prof is not None:
+            prof.lap('reset', start)
+            prof.commit()
         return obs_n
 
+    # flat snapshot of the dynamic state of the environment (see World.get_state)
+    def get_state(self):
+        return self.world.get_state()
+
+    # restore a snapshot in place, e.g. to branch rollouts from a mid-play state
+    def set_state(self, state):
+        self.world.set_state(state)
+
     # get info used for benchmarking
     def _get_info(self, agent):
         if self.info_callback is None:
@@ -192,6 +263,16 @@ class MultiAgentEnv(gym.Env):
             return np.zeros(0)
         return self.observation_callback(agent, self.world)
 
+    # write the observations of all agents into the preallocated buffer
+    def _fill_obs(self):
+        if self.observation_batch_callback is not None and self.world.use_arrays:
+            self.observation_batch_callback(self.world, self.world.sync_arrays(), out=self.obs_buf,
+                                            rows=self.policy_index)
+            return
+        for i, agent in enumerate(self.agents):
+            obs = self._get_obs(agent)
+            self.obs_buf[i, :len(obs)] = obs
+
     # get dones for a particular agent
     # unused right now -- agents are allowed to go beyond the viewing screen
     # def _get_done(self, agent):
@@ -199,38 +280,11 @@ class MultiAgentEnv(gym.Env):
     #         return False
     #     return self.done_callback(agent, self.world)
 
-    def done_callback(self, agent, world):    
-        # Use world.timeout, and see what's wrong
-        if world.time > world.timeout:
-            return Q_BACK_THREW_BALL
-
-        # Agent is done if it is out of bounds
-        if (not agent.in_bounds):
-            return AGENT_OUT_OF_BOUNDS
-
-        q_back = list(filter(lambda player: player.position == 'q_back', world.agents))[0]
-        d_line = list(filter(lambda player: player.position == 'd_line', world.agents))
-        line_of_scrimmage = world.line_of_scrimmage
-        q_pos = q_back.state.p_pos
-
-        # Quarterback is past line of scrimmage
-        if (q_pos[1] > (line_of_scrimmage + world.first_down_line)): 
-            return Q_BACK_FIRST_DOWN_LINE
-
-        if (not q_back.in_bounds):
-            return Q_BACK_NOT_IN_BOUNDS
-
-        for d_player in d_line:
-            # Check if d_player is close to q_back (ie touching, look into how to find that out)
-            # If so return True
-            d_pos = d_player.state.p_pos
-            dist_min = q_back.size + d_player.size
-
-            # If the quarterback and defensive player are touching, set agents to done
-            if (((d_pos[0] - q_pos[0])**2 + (d_pos[1] - q_pos[1])**2)**0.5 < dist_min):
-                return D_LINE_REACHED_Q_BACK
-
-        return NOT_DONE
+    # done code of a single agent (see termination.PlayTermination)
+    def done_callback(self, agent, world):
+        if self.termination is None:
+            return NOT_DONE
+        return int(self.termination.world_done_codes(world)[self.agents.index(agent)])
 
 
     # get reward for a particular agent
@@ -239,61 +293,80 @@ class MultiAgentEnv(gym.Env):
             return 0.0
         return self.reward_callback(agent, self.world)
 
-    # set env action for a particular agent
-    def _set_action(self, action, agent, action_space, time=None):
-        agent.action.u = np.zeros(self.world.dim_p)
-        agent.action.c = np.zeros(self.world.dim_c)
-        # process action
-        if isinstance(action_space, MultiDiscrete):
-            act = []
-            size = action_space.high - action_space.low + 1
-            index = 0
-            for s in size:
-                act.append(action[index:(index+s)])
-                index += s
-            action = act
-        else:
-            action = [action]
-
-        if agent.movable:
-            # physical action
-            if self.discrete_action_input:
-                agent.action.u = np.zeros(self.world.dim_p)
-                # process discrete action
-                if action[0] == 1: agent.action.u[0] = -1.0
-                if action[0] == 2: agent.action.u[0] = +1.0
-                if action[0] == 3: agent.action.u[1] = -1.0
-                if action[0] == 4: agent.action.u[1] = +1.0
-            else:
-                if self.force_discrete_action:
-                    d = np.argmax(action[0])
-                    action[0][:] = 0.0
-                    action[0][d] = 1.0
-                if self.discrete_action_space:
-                    agent.action.u[0] += action[0][1] - action[0][2]
-                    agent.action.u[1] += action[0][3] - action[0][4]
-                else:
-                    agent.action.u = action[0]
-            sensitivity = 5.0
-            if agent.accel is not None:
-                sensitivity = agent.accel
-            agent.action.u *= sensitivity
-            action = action[1:]
-        if not agent.silent:
-            # communication action
-            if self.discrete_action_input:
-                agent.action.c = np.zeros(self.world.dim_c)
-                agent.action.c[action[0]] = 1.0
-            else:
-                agent.action.c = action[0]
-            action = action[1:]
-        # make sure we used all elements of action
-        assert len(action) == 0
+    # set env actions of all agents at once; with the array backend the
+    # actions are written straight into the world arrays
+    def _set_actions(self, action_n):
+        if self.world.use_arrays:
+            arrays = self.world.sync_arrays()
+            u, c = self.action_decoder.decode(action_n, arrays.sensitivity[self.policy_index])
+            arrays.u[self.policy_index] = u
+            arrays.action_c[self.policy_index] = c
+            return
+        sensitivity = np.array([5.0 if agent.accel is None else agent.accel for agent in self.agents])
+        u, c = self.action_decoder.decode(action_n, sensitivity)
+        for i, agent in enumerate(self.agents):
+            agent.action.u = u[i]
+            agent.action.c = c[i]
+
+    # stream every frame rendered from now on to path (see recording.Recorder)
+    def start_recording(self, path, **kwargs):
+        from multiagent.recording import Recorder
+        self.stop_recording()
+        self.recorder = Recorder(path, **kwargs)
+        return self.recorder
+
+    # finish writing the recorded frames
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    # log the state after every reset and step to a trajectory directory at
+    # path, which trajectory.Trajectory can replay without running physics
+    def start_logging(self, path):
+        from multiagent.trajectory import TrajectoryWriter
+        self.stop_logging()
+        self.trajectory = TrajectoryWriter(path, self.world, self.n)
+        return self.trajectory
+
+    def stop_logging(self):
+        if self.trajectory is not None:
+            self.trajectory.close()
+            self.trajectory = None
+
+    # time every phase of reset and step (environment and world) from now on,
+    # keeping the last window steps (see profiling.Profiler)
+    def start_profiling(self, window=1000):
+        from multiagent.profiling import Profiler
+        self.profiler = Profiler(window)
+        self.world.profiler = self.profiler
+        return self.profiler
+
+    def stop_profiling(self):
+        self.profiler = None
+        self.world.profiler = None
+
+    # {phase: {'count', 'mean', 'p50', 'p99', 'max'}} of the steps profiled so far
+    def profile_stats(self):
+        return {} if self.profiler is None else self.profiler.stats()
+
+    # rendering backend: the OpenGL viewer, or the NumPy rasterizer when headless
+    def _rendering(self):
+        if self.headless:
+            from multiagent import raster
+            return raster
+        from multiagent import rendering
+        return rendering
 
     # reset rendering assets
     def _reset_render(self):
         self.render_geoms = None
         self.render_geoms_xform = None
+        # geometry of the whole field view, kept apart from the agent views
+        self.field_geoms = None
+        self.field_geoms_xform = None
+        self.field_lines = None
+        self.field_lines_at = None
 
     # render environment
     def render_whole_field(self, mode='human'):
@@ -319,42 +392,47 @@ class MultiAgentEnv(gym.Env):
         #         self.viewers[i] = rendering.Viewer(700,700)
 
         if self.viewer is None:
-            from multiagent import rendering
+            rendering = self._rendering()
             self.viewer = rendering.Viewer(53*7, 120*7)
 
         # create rendering geometry
-        if self.render_geoms is None:
+        if self.field_geoms is None:
             # import rendering only if we need it (and don't import for headless machines)
             #from gym.envs.classic_control import rendering
-            from multiagent import rendering
-            self.render_geoms = []
-            self.render_geoms_xform = []
+            rendering = self._rendering()
+            self.field_geoms = []
+            self.field_geoms_xform = []
             for entity in self.world.entities:
                 size = 2*entity.size
                 # if entity.position == 'q_back':
                 #     size = 2*size
                 geom = rendering.make_circle(size)
                 xform = rendering.Transform()
-                if 'q_back' == entity.position:
+                if getattr(entity, 'position', None) == Q_BACK:
                     geom.set_color(0, 1, 0, alpha=0.5)
                 else:
                     geom.set_color(*entity.color)
                 geom.add_attr(xform)
-                self.render_geoms.append(geom)
-                self.render_geoms_xform.append(xform)
+                self.field_geoms.append(geom)
+                self.field_geoms_xform.append(xform)
+
+            # line of scrimmage and first down line, drawn over the entities
+            self.field_lines = [rendering.Line(), rendering.Line()]
 
             self.viewer.geoms = []
-            for geom in self.render_geoms:
+            for geom in self.field_geoms + self.field_lines:
                 self.viewer.add_geom(geom)
 
         line_of_scrimmage = self.world.line_of_scrimmage
         first_down_line = line_of_scrimmage + self.world.first_down_line
 
-        self.viewer.draw_line((0, line_of_scrimmage), (53, line_of_scrimmage))
-        self.viewer.draw_line((0, first_down_line), (53, first_down_line))
+        # move the field lines only when the play changes them
+        if self.field_lines_at != (line_of_scrimmage, first_down_line):
+            for line, y in zip(self.field_lines, (line_of_scrimmage, first_down_line)):
+                line.start, line.end = (0, y), (53, y)
+            self.field_lines_at = (line_of_scrimmage, first_down_line)
 
         results = []
-        from multiagent import rendering
         # update bounds to center around agent
         cam_range = 1
         if self.shared_viewer:
@@ -364,9 +442,12 @@ class MultiAgentEnv(gym.Env):
         self.viewer.set_bounds(0, 53, 0, 120)
         # update geometry positions
         for e, entity in enumerate(self.world.entities):
-            self.render_geoms_xform[e].set_translation(*entity.state.p_pos)
+            self.field_geoms_xform[e].set_translation(*entity.state.p_pos)
         # render to display or array
-        results.append(self.viewer.render(return_rgb_array = mode=='rgb_array'))
+        frame = self.viewer.render(return_rgb_array = mode=='rgb_array' or self.recorder is not None)
+        if self.recorder is not None:
+            self.recorder.write(frame)
+        results.append(frame if mode=='rgb_array' else self.viewer.isopen)
 
         return results
 
@@ -390,20 +471,20 @@ class MultiAgentEnv(gym.Env):
             if self.viewers[i] is None:
                 # import rendering only if we need it (and don't import for headless machines)
                 #from gym.envs.classic_control import rendering
-                from multiagent import rendering
+                rendering = self._rendering()
                 self.viewers[i] = rendering.Viewer(700,700)
 
         # create rendering geometry
         if self.render_geoms is None:
             # import rendering only if we need it (and don't import for headless machines)
             #from gym.envs.classic_control import rendering
-            from multiagent import rendering
+            rendering = self._rendering()
             self.render_geoms = []
             self.render_geoms_xform = []
             for entity in self.world.entities:
                 geom = rendering.make_circle(entity.size)
                 xform = rendering.Transform()
-                if 'q_back' == entity.position:
+                if getattr(entity, 'position', None) == Q_BACK:
                     geom.set_color(0, 1, 0, alpha=0.5)
                 else:
                     geom.set_color(*entity.color)
@@ -419,7 +500,6 @@ class MultiAgentEnv(gym.Env):
 
         results = []
         for i in range(len(self.viewers)):
-            from multiagent import rendering
             # update bounds to center around agent
             cam_range = 1
             if self.shared_viewer:
@@ -430,8 +510,12 @@ class MultiAgentEnv(gym.Env):
             # update geometry positions
             for e, entity in enumerate(self.world.entities):
                 self.render_geoms_xform[e].set_translation(*entity.state.p_pos)
-            # render to display or array
-            results.append(self.viewers[i].render(return_rgb_array = mode=='rgb_array'))
+            # render to display or array, recording the first view
+            record = self.recorder is not None and i == 0
+            frame = self.viewers[i].render(return_rgb_array = mode=='rgb_array' or record)
+            if record:
+                self.recorder.write(frame)
+            results.append(frame if mode=='rgb_array' else self.viewers[i].isopen)
 
         return results
 
@@ -500,9 +584,15 @@ class BatchMultiAgentEnv(gym.Env):
             obs_n += env.reset()
         return obs_n
 
-    # render environment
+    # render environment; rgb_array frames of all environments are rasterized
+    # together into one (n_envs, H, W, 3) array (see raster.BatchRenderer)
     def render(self, mode='human', close=True):
+        if mode == 'rgb_array':
+            from multiagent import raster
+            view, p_pos, radius, color, lines = raster.world_scene([env.world for env in self.env_batch])
+            bounds, (width, height), _ = view
+            return raster.BatchRenderer(width, height, bounds).render(p_pos, radius, color, lines)
         results_n = []
         for env in self.env_batch:
-            results_n += env.render(mode, close)
+            results_n += env.render(mode)
         return results_n
@@ -0,0 +1,108 @@
+"""
+Disk-backed experience store for multi-agent transitions. Observations,
+actions, rewards, next observations and done codes of all agents live in
+fixed-dtype ring buffers memory-mapped from one directory, so the store can
+outgrow RAM and be opened read-only by any number of learner processes while
+one actor process appends to it.
+"""
+import json
+import os
+import numpy as np
+
+class TransitionStore(object):
+    # fields of a transition: (dtype, per-agent width argument)
+    fields = {
+        'obs': ('float32', 'obs_dim'),
+        'act': ('float32', 'act_dim'),
+        'rew': ('float32', None),
+        'next_obs': ('float32', 'obs_dim'),
+        'done': ('int8', None),
+    }
+
+    # open the store at path; a new store is created when capacity, n (number
+    # of agents), obs_dim and act_dim are given. Observations and actions of
+    # different sizes are zero padded to obs_dim and act_dim
+    def __init__(self, path, capacity=None, n=None, obs_dim=None, act_dim=None, readonly=False):
+        self.path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if capacity is not None:
+            assert not readonly, 'a read-only store cannot be created'
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            meta = {'capacity': capacity, 'n': n, 'obs_dim': obs_dim, 'act_dim': act_dim}
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+            mode = 'w+'
+        else:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            mode = 'r' if readonly else 'r+'
+        self.meta = meta
+        self.capacity, self.n = meta['capacity'], meta['n']
+        self.readonly = readonly
+        self.buffers = {}
+        for name, (dtype, width) in self.fields.items():
+            shape = (self.capacity, self.n) + ((meta[width],) if width else ())
+            self.buffers[name] = np.memmap(os.path.join(path, name + '.bin'), dtype=dtype, mode=mode, shape=shape)
+        # next write position and number of stored transitions, shared with readers
+        self.cursor = np.memmap(os.path.join(path, 'cursor.bin'), dtype=np.int64, mode=mode, shape=(2,))
+
+    # open an existing store for sampling only
+    @classmethod
+    def open(cls, path):
+        return cls(path, readonly=True)
+
+    def __len__(self):
+        return int(self.cursor[1])
+
+    # append one transition of all agents
+    def add(self, obs_n, act_n, rew_n, next_obs_n, done_n):
+        self.add_batch([obs_n], [act_n], [rew_n], [next_obs_n], [done_n])
+
+    # append the transitions of a batch of environments, each argument
+    # holding (batch, n, ...) values or per-environment lists of per-agent ones
+    def add_batch(self, obs_n, act_n, rew_n, next_obs_n, done_n):
+        values = {'obs': obs_n, 'act': act_n, 'rew': rew_n, 'next_obs': next_obs_n, 'done': done_n}
+        k = len(obs_n)
+        index = (int(self.cursor[0]) + np.arange(k)) % self.capacity
+        for name, value in values.items():
+            buffer = self.buffers[name]
+            if buffer.ndim == 3:
+                self._write_padded(buffer, index, value)
+            else:
+                buffer[index] = value
+        # publish the new transitions only after they are written
+        self.cursor[0] = (int(self.cursor[0]) + k) % self.capacity
+        self.cursor[1] = min(int(self.cursor[1]) + k, self.capacity)
+
+    @staticmethod
+    def _write_padded(buffer, index, value):
+        if isinstance(value, np.ndarray) and value.ndim == 3 and value.shape[-1] == buffer.shape[-1]:
+            buffer[index] = value
+            return
+        for row, per_agent in zip(index, value):
+            buffer[row] = 0.0
+            for i, v in enumerate(per_agent):
+                v = np.asarray(v).ravel()
+                buffer[row, i, :len(v)] = v
+
+    # indices of batch_size transitions drawn uniformly from the store
+    def sample_index(self, batch_size, rng=None):
+        size = len(self)
+        assert size > 0, 'cannot sample from an empty store'
+        randint = np.random.randint if rng is None else rng.integers
+        return randint(0, size, batch_size)
+
+    # minibatch of transitions of all agents at the given indices: a dict of
+    # (batch, n, ...) arrays gathered straight from the mapped buffers
+    def get(self, index):
+        return {name: np.asarray(buffer[index]) for name, buffer in self.buffers.items()}
+
+    def sample(self, batch_size, rng=None):
+        return self.get(self.sample_index(batch_size, rng))
+
+    def flush(self):
+        if not self.readonly:
+            for buffer in self.buffers.values():
+                buffer.flush()
+            self.cursor.flush()
@@ -0,0 +1,222 @@
+"""
+Observation building for all agents of a world in one pass. Scenarios
+declare the components of each agent's observation (own state, positions of
+landmarks and other agents relative to the observer, other agents' velocities
+or communication, visibility masks) once, and the builder evaluates them
+for all agents with a handful of array operations on the entity arrays.
+"""
+import numpy as np
+from multiagent.spatial import k_smallest, pad_neighbors
+
+# entity state of a world as arrays: the world's own entity arrays when it
+# uses the array backend, otherwise gathered from the entity states
+def world_arrays(world):
+    if world.use_arrays:
+        return world.sync_arrays()
+    return StateArrays(world)
+
+class StateArrays(object):
+    def __init__(self, world):
+        entities = world.entities
+        zeros_p = np.zeros(world.dim_p)
+        zeros_c = np.zeros(world.dim_c)
+        self.p_pos = np.array([entity.state.p_pos for entity in entities])
+        self.p_vel = np.array([zeros_p if entity.state.p_vel is None else entity.state.p_vel for entity in entities])
+        self.c = np.array([zeros_c if agent.state.c is None else agent.state.c
+                           for agent in world.agents]).reshape((len(world.agents), world.dim_c))
+        self.size = np.array([entity.size for entity in entities])
+
+# quantities shared by the components while building the observations of
+# the given agents (rows); results of masks and custom terms are cached.
+# index is the spatial.NeighborIndex of the agent positions, if available
+class ObservationContext(object):
+    def __init__(self, arrays, rows, index=None):
+        self.arrays = arrays
+        self.rows = rows
+        self.index = index
+        self.cache = {}
+        self._relative = None
+
+    # (..., len(rows), n_entities, dim_p) positions of all entities seen from each agent
+    @property
+    def relative(self):
+        if self._relative is None:
+            p_pos = self.arrays.p_pos
+            self._relative = p_pos[..., None, :, :] - p_pos[..., self.rows, None, :]
+        return self._relative
+
+    # value of fn(ctx), computed once per build
+    def cached(self, fn):
+        if fn not in self.cache:
+            self.cache[fn] = fn(self)
+        return self.cache[fn]
+
+# whether entities a and b touch (distance below the sum of their sizes)
+def touching(arrays, a, b):
+    p_pos = arrays.p_pos
+    delta_pos = p_pos[..., a, None, :] - p_pos[..., None, b, :]
+    dist = np.sqrt(np.sum(np.square(delta_pos), axis=-1))
+    return dist < arrays.size[..., a, None] + arrays.size[..., None, b]
+
+# values (..., n, d) of the entities at index (..., m, k), as (..., m, k, d)
+def gather(values, index):
+    return np.take_along_axis(values[..., None, :, :], index[..., None], axis=-2)
+
+class ObservationBuilder(object):
+    def __init__(self, world):
+        self.n_agents = len(world.agents)
+        self.dims = {'p_pos': world.dim_p, 'p_vel': world.dim_p, 'c': world.dim_c}
+        self.layouts = []
+        self._groups = {}
+        # whether some component queries the neighbors of the agents
+        self.spatial = False
+
+    # start a new layout used by the given agents (default all); components
+    # are appended to the most recent layout, and agents covered by several
+    # layouts use the first one
+    def layout(self, agents=None):
+        agents = range(self.n_agents) if agents is None else agents
+        self.layouts.append((set(agents), []))
+        self._groups = {}
+        return self
+
+    # append a component: width is the number of features (an int, or a
+    # function of the agent index), fn(ctx, rows, sel) returns the
+    # (..., len(rows), width) features of agents rows = ctx.rows[sel]
+    def add(self, width, fn):
+        if not self.layouts:
+            self.layout()
+        self.layouts[-1][1].append((width, fn))
+        self._groups = {}
+        return self
+
+    # a field ('p_pos', 'p_vel' or 'c') of the observing agent itself
+    def own(self, field):
+        return self.add(self.dims[field], lambda ctx, rows, sel: getattr(ctx.arrays, field)[..., rows, :])
+
+    # a field of one fixed agent (e.g. the communication of a leader)
+    def agent(self, field, index):
+        def fn(ctx, rows, sel):
+            value = getattr(ctx.arrays, field)[..., index, None, :]
+            return np.broadcast_to(value, value.shape[:-2] + (len(rows), value.shape[-1]))
+        return self.add(self.dims[field], fn)
+
+    # positions of the given entities relative to the observing agent
+    def entities(self, index):
+        index = np.asarray(index, dtype=int)
+        def fn(ctx, rows, sel):
+            value = ctx.relative[..., sel[:, None], index, :]
+            return value.reshape(value.shape[:-2] + (-1,))
+        return self.add(len(index) * self.dims['p_pos'], fn)
+
+    # a field of the other agents among the given ones (default all), in
+    # agent order; positions are relative to the observing agent. mask(ctx)
+    # may return the (..., len(ctx.rows), n_agents) visibility of each agent
+    # to each observer, and hidden agents are observed as zeros
+    def others(self, field='p_pos', among=None, mask=None):
+        among = list(range(self.n_agents)) if among is None else list(among)
+        indices = {}
+        def index(rows):
+            key = rows.tobytes()
+            if key not in indices:
+                others = [[j for j in among if j != i] for i in rows]
+                indices[key] = np.array(others, dtype=int).reshape((len(rows), len(others[0])))
+            return indices[key]
+        def fn(ctx, rows, sel):
+            idx = index(rows)
+            if field == 'p_pos':
+                value = ctx.relative[..., sel[:, None], idx, :]
+            else:
+                value = getattr(ctx.arrays, field)[..., idx, :]
+            if mask is not None:
+                visible = ctx.cached(mask)[..., sel[:, None], idx]
+                value = np.where(visible[..., None], value, 0.0)
+            return value.reshape(value.shape[:-2] + (-1,))
+        width = lambda i: len([j for j in among if j != i]) * self.dims[field]
+        return self.add(width, fn)
+
+    # the k nearest other agents of the observing agent among the given ones
+    # (default all), nearest first, optionally only those within radius: for
+    # each neighbor the given fields (positions relative to the observing
+    # agent), then if mask a flag per neighbor telling whether it was found.
+    # Missing neighbors are observed as zeros, so the width stays fixed
+    # however large the roster grows
+    def nearest(self, k, among=None, radius=None, fields=('p_pos',), mask=False):
+        among = np.arange(self.n_agents) if among is None else np.asarray(among, dtype=int)
+        self.spatial = True
+        def neighbors(ctx, rows, sel):
+            if ctx.index is not None:
+                index, _, found = ctx.index.neighbors(rows, k, radius, among)
+                return index, found
+            relative = ctx.relative[..., sel[:, None], among, :]
+            dist = np.sum(np.square(relative), axis=-1)
+            dist = np.where(among == rows[:, None], np.inf, dist)
+            if radius is not None:
+                dist = np.where(dist <= radius ** 2, dist, np.inf)
+            order = k_smallest(dist, k)
+            found = np.isfinite(np.take_along_axis(dist, order, axis=-1))
+            return pad_neighbors(np.where(found, among[order], 0), found, k)
+        def fn(ctx, rows, sel):
+            index, found = neighbors(ctx, rows, sel)
+            values = []
+            for field in fields:
+                value = gather(getattr(ctx.arrays, field), index)
+                if field == 'p_pos':
+                    value = value - ctx.arrays.p_pos[..., rows, None, :]
+                values.append(value)
+            value = np.where(found[..., None], np.concatenate(values, axis=-1), 0.0)
+            value = [value.reshape(value.shape[:-2] + (-1,))]
+            if mask:
+                value.append(found.astype(float))
+            return np.concatenate(value, axis=-1)
+        width = k * (sum(self.dims[field] for field in fields) + mask)
+        return self.add(width, fn)
+
+    # (layout components, positions in rows, width) of the groups of agents
+    # sharing a layout and component widths
+    def _grouping(self, rows):
+        key = rows.tobytes()
+        if key not in self._groups:
+            groups = {}
+            for s, i in enumerate(rows):
+                for l, (agents, components) in enumerate(self.layouts):
+                    if i in agents:
+                        break
+                else:
+                    raise ValueError('agent %d is not covered by any observation layout' % i)
+                widths = tuple(w(i) if callable(w) else w for w, _ in components)
+                groups.setdefault((l, widths), []).append(s)
+            self._groups[key] = [(self.layouts[l][1], np.array(sel, dtype=int), sum(widths))
+                                 for (l, widths), sel in groups.items()]
+        return self._groups[key]
+
+    # observations of the given agents (default all): an (..., n, obs_dim)
+    # array if all observations have the same size, otherwise a list of
+    # (..., obs_dim_i) arrays; out may be a zero padded (..., n, max_dim)
+    # buffer. Neighbor queries of a single world use its spatial index
+    # (see World.neighbor_index) when the world is given
+    def build(self, arrays, rows=None, out=None, world=None):
+        rows = np.arange(self.n_agents) if rows is None else np.asarray(rows, dtype=int)
+        index = None
+        if self.spatial and world is not None and arrays.p_pos.ndim == 2:
+            index = world.neighbor_index()
+        ctx = ObservationContext(arrays, rows, index)
+        groups = self._grouping(rows)
+        lead = arrays.p_pos.shape[:-2]
+        if out is None and len(set(dim for _, _, dim in groups)) <= 1:
+            out = np.zeros(lead + (len(rows), groups[0][2] if groups else 0))
+        result = [None] * len(rows) if out is None else out
+        for components, sel, dim in groups:
+            block = np.concatenate([fn(ctx, rows[sel], sel) for _, fn in components], axis=-1)
+            if out is None:
+                for s, obs in zip(sel, np.moveaxis(block, -2, 0)):
+                    result[s] = obs
+            else:
+                out[..., sel, :dim] = block
+                out[..., sel, dim:] = 0.0
+        return result
+
+    # observation of a single agent of the world
+    def observe(self, agent, world):
+        obs = self.build(world_arrays(world), rows=[world.agents.index(agent)], world=world)
+        return obs[..., 0, :]
@@ -0,0 +1,96 @@
+"""
+Vectorized physics kernels operating on the contiguous entity arrays of a
+World (see core.EntityArrays). Every kernel broadcasts over any leading
+axes, so the same code advances a single world or a batch of worlds.
+"""
+import numpy as np
+
+# write the agents' action forces (plus their scaled motor noise) into the
+# leading rows of p_force and zero the forces on immovable entities
+def apply_action_force(p_force, u, movable, noise=None, u_noise=None):
+    n = u.shape[-2]
+    p_force[..., :n, :] = u
+    if noise is not None:
+        p_force[..., :n, :] += noise * u_noise[..., None]
+    p_force[~movable] = 0.0
+    return p_force
+
+# damp velocities, apply forces, clamp speeds and advance positions in place
+def integrate_state(p_pos, p_vel, p_force, mass, max_speed, movable, damping, dt):
+    p_vel_new = p_vel * (1 - damping) + (p_force / mass[..., None]) * dt
+    speed = np.sqrt(np.sum(np.square(p_vel_new), axis=-1))
+    too_fast = speed > max_speed
+    # dividing and multiplying by one leaves the other velocities untouched
+    p_vel_new = p_vel_new / np.where(too_fast, speed, 1.0)[..., None] * np.where(too_fast, max_speed, 1.0)[..., None]
+    movable = movable[..., None]
+    np.copyto(p_vel, p_vel_new, where=movable)
+    np.add(p_pos, p_vel * dt, out=p_pos, where=movable)
+
+# whether each position lies inside the [[x_min, y_min], [x_max, y_max]] borders
+def in_bounds(p_pos, borders):
+    lower = np.asarray(borders[0], dtype=float)
+    upper = np.asarray(borders[1], dtype=float)
+    return ~np.any((p_pos < lower) | (p_pos > upper), axis=-1)
+
+# index pairs (a < b) of all colliding entities, in the order the pairwise loop visits them
+def collision_pairs(collide):
+    colliders = np.flatnonzero(collide)
+    a, b = np.triu_indices(len(colliders), k=1)
+    return colliders[a], colliders[b]
+
+# contact force on entity a of each pair (entity b receives its negative)
+def collision_force(p_pos, size, a, b, contact_force, contact_margin):
+    # compute actual distance between entities
+    delta_pos = p_pos[..., a, :] - p_pos[..., b, :]
+    dist = np.sqrt(np.sum(np.square(delta_pos), axis=-1))
+    # minimum allowable distance
+    dist_min = size[..., a] + size[..., b]
+    # softmax penetration
+    k = contact_margin
+    penetration = np.logaddexp(0, -(dist - dist_min)/k)*k
+    return contact_force * delta_pos / dist[..., None] * penetration[..., None]
+
+# add the collision forces of the given pairs to p_force in place
+def apply_collision_force(p_force, p_pos, size, movable, a, b, contact_force, contact_margin):
+    if len(a) == 0:
+        return p_force
+    force = collision_force(p_pos, size, a, b, contact_force, contact_margin)
+    # interleave (a, b) so that each entity accumulates its contacts in pair
+    # order, which reproduces the sums of the pairwise loop exactly
+    index = np.stack([a, b], axis=-1).reshape(-1)
+    force = np.stack([force, -force], axis=-2)
+    n, dim = p_force.shape[-2:]
+    force = force.reshape((-1, len(index), dim))
+    force = np.where(movable[..., index].reshape((-1, len(index), 1)), force, 0.0)
+    np.add.at(p_force.reshape((-1, n, dim)), (slice(None), index), force)
+    return p_force
+
+# colliding pairs closer than size_a + size_b + cutoff, found by sweep and prune
+# along one axis and returned in the same order as collision_pairs
+def broadphase_pairs(p_pos, size, collide, cutoff, axis=0):
+    colliders = np.flatnonzero(collide)
+    pos = p_pos[colliders]
+    radius = size[colliders]
+    if len(colliders) < 2:
+        return colliders[:0], colliders[:0]
+    # sweep: every collider against the ones after it on the axis within reach
+    order = np.argsort(pos[:, axis], kind='stable')
+    key = pos[order, axis]
+    reach = 2 * radius.max() + cutoff
+    start = np.arange(1, len(order) + 1)
+    counts = np.searchsorted(key, key + reach, side='right') - start
+    counts = np.maximum(counts, 0)
+    first = np.repeat(np.arange(len(order)), counts)
+    second = first + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    a, b = order[first], order[second]
+    # prune: keep the candidates that are actually within reach of each other
+    limit = radius[a] + radius[b] + cutoff
+    near = np.sum(np.square(pos[a] - pos[b]), axis=-1) <= np.square(limit)
+    a, b = np.minimum(a[near], b[near]), np.maximum(a[near], b[near])
+    rank = np.lexsort((b, a))
+    return colliders[a[rank]], colliders[b[rank]]
+
+# upper bound of the contact force between entities further than cutoff apart
+def collision_force_bound(cutoff, contact_force, contact_margin):
+    k = contact_margin
+    return contact_force * np.logaddexp(0, -cutoff/k)*k
@@ -0,0 +1,122 @@
+"""
+Compiled versions of the physics kernels (see physics.py) for the 'numba'
+physics backend of a World. Each kernel is one fused loop over entities (and
+worlds of a batch), which avoids the ufunc dispatch overhead that dominates
+NumPy on tiny per-entity vectors. When Numba is not installed, or an array
+is not contiguous, the NumPy kernels are used instead.
+"""
+import numpy as np
+from multiagent import physics
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+available = numba is not None
+
+def _flat(x, tail):
+    return x.reshape((-1,) + x.shape[x.ndim - tail:])
+
+def _contiguous(*arrays):
+    return all(x.flags.c_contiguous for x in arrays)
+
+if available:
+    @numba.njit(cache=True)
+    def _integrate_state(p_pos, p_vel, p_force, mass, max_speed, movable, damping, dt):
+        for k in range(p_pos.shape[0]):
+            for i in range(p_pos.shape[1]):
+                if not movable[k, i]:
+                    continue
+                s = 0.0
+                for d in range(p_pos.shape[2]):
+                    v = p_vel[k, i, d] * (1 - damping) + (p_force[k, i, d] / mass[k, i]) * dt
+                    p_vel[k, i, d] = v
+                    s += v * v
+                speed = np.sqrt(s)
+                if speed > max_speed[k, i]:
+                    for d in range(p_pos.shape[2]):
+                        p_vel[k, i, d] = p_vel[k, i, d] / speed * max_speed[k, i]
+                for d in range(p_pos.shape[2]):
+                    p_pos[k, i, d] += p_vel[k, i, d] * dt
+
+    @numba.njit(cache=True)
+    def _in_bounds(p_pos, lower, upper, out):
+        for k in range(p_pos.shape[0]):
+            for i in range(p_pos.shape[1]):
+                inside = True
+                for d in range(p_pos.shape[2]):
+                    if p_pos[k, i, d] < lower[d] or p_pos[k, i, d] > upper[d]:
+                        inside = False
+                out[k, i] = inside
+
+    @numba.njit(cache=True)
+    def _apply_collision_force(p_force, p_pos, size, movable, a, b, contact_force, contact_margin):
+        dim = p_pos.shape[2]
+        delta = np.empty(dim)
+        for k in range(p_pos.shape[0]):
+            for p in range(len(a)):
+                i, j = a[p], b[p]
+                s = 0.0
+                for d in range(dim):
+                    delta[d] = p_pos[k, i, d] - p_pos[k, j, d]
+                    s += delta[d] * delta[d]
+                dist = np.sqrt(s)
+                # softmax penetration, log(1 + exp(x)) computed as logaddexp(0, x)
+                x = -(dist - (size[k, i] + size[k, j])) / contact_margin
+                penetration = (max(x, 0.0) + np.log1p(np.exp(-abs(x)))) * contact_margin
+                for d in range(dim):
+                    f = contact_force * delta[d] / dist * penetration
+                    if movable[k, i]:
+                        p_force[k, i, d] += f
+                    if movable[k, j]:
+                        p_force[k, j, d] -= f
+
+    @numba.njit(cache=True)
+    def _apply_action_force(p_force, u, movable, noise, u_noise, has_noise):
+        for k in range(p_force.shape[0]):
+            for i in range(p_force.shape[1]):
+                for d in range(p_force.shape[2]):
+                    if not movable[k, i]:
+                        p_force[k, i, d] = 0.0
+                    elif i < u.shape[1]:
+                        f = u[k, i, d]
+                        if has_noise:
+                            f += noise[k, i, d] * u_noise[k, i]
+                        p_force[k, i, d] = f
+
+# see physics.integrate_state
+def integrate_state(p_pos, p_vel, p_force, mass, max_speed, movable, damping, dt):
+    if not available or not _contiguous(p_pos, p_vel):
+        return physics.integrate_state(p_pos, p_vel, p_force, mass, max_speed, movable, damping, dt)
+    _integrate_state(_flat(p_pos, 2), _flat(p_vel, 2), _flat(np.ascontiguousarray(p_force), 2),
+                     _flat(mass, 1), _flat(max_speed, 1), _flat(movable, 1), float(damping), float(dt))
+
+# see physics.in_bounds
+def in_bounds(p_pos, borders):
+    if not available:
+        return physics.in_bounds(p_pos, borders)
+    out = np.empty(p_pos.shape[:-1], dtype=bool)
+    _in_bounds(_flat(np.ascontiguousarray(p_pos), 2), np.asarray(borders[0], dtype=float),
+               np.asarray(borders[1], dtype=float), _flat(out, 1))
+    return out
+
+# see physics.apply_collision_force
+def apply_collision_force(p_force, p_pos, size, movable, a, b, contact_force, contact_margin):
+    if not available or not _contiguous(p_force):
+        return physics.apply_collision_force(p_force, p_pos, size, movable, a, b, contact_force, contact_margin)
+    _apply_collision_force(_flat(p_force, 2), _flat(np.ascontiguousarray(p_pos), 2), _flat(size, 1),
+                           _flat(movable, 1), np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64),
+                           float(contact_force), float(contact_margin))
+    return p_force
+
+# see physics.apply_action_force
+def apply_action_force(p_force, u, movable, noise=None, u_noise=None):
+    if not available or not _contiguous(p_force):
+        return physics.apply_action_force(p_force, u, movable, noise, u_noise)
+    has_noise = noise is not None
+    if not has_noise:
+        noise, u_noise = u, np.zeros(u.shape[:-1])
+    _apply_action_force(_flat(p_force, 2), _flat(np.ascontiguousarray(u), 2), _flat(movable, 1),
+                        _flat(np.ascontiguousarray(noise), 2), _flat(np.ascontiguousarray(u_noise), 1), has_noise)
+    return p_force
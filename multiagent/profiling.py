@@ -0,0 +1,72 @@
+"""
+Per-phase step timing. A Profiler attached to an environment (see
+MultiAgentEnv.start_profiling) receives the wall time of every phase of a
+step (action decoding, scripted agents, forces, integration, observations,
+rewards, ...) and keeps the last `window` per-step totals of each phase, from
+which it reports percentiles or dumps them as JSON. Without a profiler the
+instrumented code only pays an `is None` check per phase.
+"""
+import json
+from collections import deque
+from time import perf_counter
+import numpy as np
+
+class Profiler(object):
+    def __init__(self, window=1000):
+        self.window = window
+        # rolling per-step totals of each phase, in seconds
+        self.samples = {}
+        # totals of the step in progress
+        self.pending = {}
+
+    @staticmethod
+    def clock():
+        return perf_counter()
+
+    # add the time since start to phase name of the current step and return
+    # the current clock, to be used as the start of the next phase
+    def lap(self, name, start):
+        now = perf_counter()
+        self.pending[name] = self.pending.get(name, 0.0) + (now - start)
+        return now
+
+    # close the current step, moving its phase totals into the histograms
+    def commit(self):
+        for name, seconds in self.pending.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(seconds)
+        self.pending.clear()
+
+    def reset(self):
+        self.samples.clear()
+        self.pending.clear()
+
+    # {phase: {'count', 'mean', 'p50', 'p99', 'max'}} with times in seconds
+    def stats(self):
+        stats = {}
+        for name, samples in self.samples.items():
+            values = np.fromiter(samples, dtype=float, count=len(samples))
+            p50, p99 = np.percentile(values, [50, 99])
+            stats[name] = {
+                'count': len(values),
+                'mean': float(values.mean()),
+                'p50': float(p50),
+                'p99': float(p99),
+                'max': float(values.max()),
+            }
+        return stats
+
+    # human-readable table of stats(), phases sorted by mean time
+    def summary(self):
+        stats = self.stats()
+        lines = ['%-16s %8s %10s %10s %10s' % ('phase', 'count', 'mean ms', 'p50 ms', 'p99 ms')]
+        for name in sorted(stats, key=lambda name: -stats[name]['mean']):
+            s = stats[name]
+            lines.append('%-16s %8d %10.4f %10.4f %10.4f' % (name, s['count'], 1e3 * s['mean'],
+                                                             1e3 * s['p50'], 1e3 * s['p99']))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump({'window': self.window, 'unit': 's', 'phases': self.stats()}, f, indent=2)
@@ -0,0 +1,381 @@
+"""
+Headless 2D rendering in pure NumPy. Mirrors the Viewer and geometry
+interface of multiagent.rendering (circles, polygons, lines, transforms and
+colors with alpha) but rasterizes straight into a preallocated uint8 frame
+buffer, so rgb_array frames need neither a display nor an OpenGL context.
+"""
+from __future__ import division
+import math
+import numpy as np
+
+class Viewer(object):
+    def __init__(self, width, height, display=None):
+        self.width = width
+        self.height = height
+
+        self.geoms = []
+        self.onetime_geoms = []
+        self.transform = Transform()
+        self.isopen = True
+        # frame buffer drawn into by every render
+        self.frame = np.full((height, width, 3), 255, dtype=np.uint8)
+        # pixel centers in window coordinates (y pointing up, as in OpenGL)
+        self.px = np.arange(width) + 0.5
+        self.py = height - (np.arange(height) + 0.5)
+
+    def close(self):
+        self.isopen = False
+
+    def set_bounds(self, left, right, bottom, top):
+        assert right > left and top > bottom
+        scalex = self.width/(right-left)
+        scaley = self.height/(top-bottom)
+        self.transform = Transform(
+            translation=(-left*scalex, -bottom*scaley),
+            scale=(scalex, scaley))
+
+    def add_geom(self, geom):
+        self.geoms.append(geom)
+
+    def add_onetime(self, geom):
+        self.onetime_geoms.append(geom)
+
+    # draw all geoms; returns a copy of the frame buffer if return_rgb_array,
+    # otherwise whether the viewer is still open
+    def render(self, return_rgb_array=False):
+        self.frame[...] = 255
+        for geom in self.geoms:
+            geom.render(self)
+        for geom in self.onetime_geoms:
+            geom.render(self)
+        self.onetime_geoms = []
+        return self.frame.copy() if return_rgb_array else self.isopen
+
+    # Convenience
+    def draw_circle(self, radius=10, res=30, filled=True, **attrs):
+        geom = make_circle(radius=radius, res=res, filled=filled)
+        _add_attrs(geom, attrs)
+        self.add_onetime(geom)
+        return geom
+
+    def draw_polygon(self, v, filled=True, **attrs):
+        geom = make_polygon(v=v, filled=filled)
+        _add_attrs(geom, attrs)
+        self.add_onetime(geom)
+        return geom
+
+    def draw_polyline(self, v, **attrs):
+        geom = make_polyline(v=v)
+        _add_attrs(geom, attrs)
+        self.add_onetime(geom)
+        return geom
+
+    def draw_line(self, start, end, **attrs):
+        geom = Line(start, end)
+        _add_attrs(geom, attrs)
+        self.add_onetime(geom)
+        return geom
+
+    def get_array(self):
+        return self.frame.copy()
+
+    # rows and columns of the frame covering window-space points, padded by pad pixels
+    def _window(self, points, pad):
+        x0 = max(int(math.floor(points[:, 0].min() - pad)), 0)
+        x1 = min(int(math.ceil(points[:, 0].max() + pad)), self.width)
+        r0 = max(int(math.floor(self.height - points[:, 1].max() - pad)), 0)
+        r1 = min(int(math.ceil(self.height - points[:, 1].min() + pad)), self.height)
+        return slice(r0, max(r0, r1)), slice(x0, max(x0, x1))
+
+    # alpha-blend an (r, g, b, alpha) color into the masked pixels of a window
+    def _blend(self, rows, cols, mask, color):
+        if not mask.any():
+            return
+        region = self.frame[rows, cols]
+        src = np.array(color[:3], dtype=float) * 255
+        alpha = color[3]
+        blended = src * alpha + region[mask] * (1 - alpha)
+        region[mask] = np.clip(np.rint(blended), 0, 255).astype(np.uint8)
+
+    # fill a polygon given by (n, 2) window-space vertices (even-odd rule)
+    def fill_polygon(self, points, color):
+        rows, cols = self._window(points, 0)
+        x = self.px[cols][None, :, None]
+        y = self.py[rows][:, None, None]
+        if x.size == 0 or y.size == 0:
+            return
+        x0, y0 = points[:, 0], points[:, 1]
+        x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+        # edges crossed by a ray from each pixel center towards +x
+        spans = (y0 > y) != (y1 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = x < (x1 - x0) * (y - y0) / (y1 - y0) + x0
+        mask = np.sum(spans & crossing, axis=-1) % 2 == 1
+        self._blend(rows, cols, mask, color)
+
+    # stroke the segments between (n, 2) window-space vertices
+    def stroke(self, points, closed, width, color):
+        start = points if closed else points[:-1]
+        end = np.roll(points, -1, axis=0) if closed else points[1:]
+        if len(start) == 0:
+            return
+        rows, cols = self._window(points, width)
+        x = self.px[cols][None, :, None]
+        y = self.py[rows][:, None, None]
+        if x.size == 0 or y.size == 0:
+            return
+        dx, dy = end[:, 0] - start[:, 0], end[:, 1] - start[:, 1]
+        length2 = np.maximum(dx * dx + dy * dy, 1e-12)
+        # distance from each pixel center to the closest point of each segment
+        t = np.clip(((x - start[:, 0]) * dx + (y - start[:, 1]) * dy) / length2, 0.0, 1.0)
+        dist2 = np.square(x - start[:, 0] - t * dx) + np.square(y - start[:, 1] - t * dy)
+        mask = np.any(dist2 <= np.square(max(width, 1.0) / 2), axis=-1)
+        self._blend(rows, cols, mask, color)
+
+def _add_attrs(geom, attrs):
+    if "color" in attrs:
+        geom.set_color(*attrs["color"])
+    if "linewidth" in attrs:
+        geom.set_linewidth(attrs["linewidth"])
+
+class Geom(object):
+    def __init__(self):
+        self._color=Color((0, 0, 0, 1.0))
+        self.attrs = [self._color]
+    # draw into the viewer's frame; a compound parent passes its color and
+    # the transforms applied after this geom's own
+    def render(self, viewer, color=None, outer=()):
+        transforms = [attr for attr in self.attrs if isinstance(attr, Transform)] + list(outer)
+        width = [attr.stroke for attr in self.attrs if isinstance(attr, LineWidth)]
+        self.render1(viewer, self._color.vec4 if color is None else color, transforms, width[-1] if width else 1.0)
+    def render1(self, viewer, color, transforms, linewidth):
+        raise NotImplementedError
+    # window-space coordinates of local vertices
+    def to_window(self, viewer, v, transforms):
+        points = np.array(v, dtype=float).reshape((-1, 2))
+        for transform in transforms:
+            points = transform.apply(points)
+        return viewer.transform.apply(points)
+    def add_attr(self, attr):
+        self.attrs.append(attr)
+    def set_color(self, r, g, b, alpha=1):
+        self._color.vec4 = (r, g, b, alpha)
+
+class Attr(object):
+    pass
+
+class Transform(Attr):
+    def __init__(self, translation=(0.0, 0.0), rotation=0.0, scale=(1,1)):
+        self.set_translation(*translation)
+        self.set_rotation(rotation)
+        self.set_scale(*scale)
+    # scale, then rotate, then translate (n, 2) points
+    def apply(self, points):
+        points = points * self.scale
+        if self.rotation:
+            c, s = math.cos(self.rotation), math.sin(self.rotation)
+            points = points.dot(np.array([[c, s], [-s, c]]))
+        return points + self.translation
+    def set_translation(self, newx, newy):
+        self.translation = (float(newx), float(newy))
+    def set_rotation(self, new):
+        self.rotation = float(new)
+    def set_scale(self, newx, newy):
+        self.scale = (float(newx), float(newy))
+
+class Color(Attr):
+    def __init__(self, vec4):
+        self.vec4 = vec4
+
+# line stipple is not rasterized; styled lines are drawn solid
+class LineStyle(Attr):
+    def __init__(self, style):
+        self.style = style
+
+class LineWidth(Attr):
+    def __init__(self, stroke):
+        self.stroke = stroke
+
+class Point(Geom):
+    def __init__(self):
+        Geom.__init__(self)
+    def render1(self, viewer, color, transforms, linewidth):
+        viewer.stroke(self.to_window(viewer, [(0.0, 0.0)] * 2, transforms), False, 1.0, color)
+
+class FilledPolygon(Geom):
+    def __init__(self, v):
+        Geom.__init__(self)
+        self.v = v
+    def render1(self, viewer, color, transforms, linewidth):
+        points = self.to_window(viewer, self.v, transforms)
+        viewer.fill_polygon(points, color)
+        outline = (color[0] * 0.5, color[1] * 0.5, color[2] * 0.5, color[3] * 0.5)
+        viewer.stroke(points, True, linewidth, outline)
+
+def make_circle(radius=10, res=30, filled=True):
+    points = []
+    for i in range(res):
+        ang = 2*math.pi*i / res
+        points.append((math.cos(ang)*radius, math.sin(ang)*radius))
+    if filled:
+        return FilledPolygon(points)
+    else:
+        return PolyLine(points, True)
+
+def make_polygon(v, filled=True):
+    if filled: return FilledPolygon(v)
+    else: return PolyLine(v, True)
+
+def make_polyline(v):
+    return PolyLine(v, False)
+
+def make_capsule(length, width):
+    l, r, t, b = 0, length, width/2, -width/2
+    box = make_polygon([(l,b), (l,t), (r,t), (r,b)])
+    circ0 = make_circle(width/2)
+    circ1 = make_circle(width/2)
+    circ1.add_attr(Transform(translation=(length, 0)))
+    geom = Compound([box, circ0, circ1])
+    return geom
+
+class Compound(Geom):
+    def __init__(self, gs):
+        Geom.__init__(self)
+        self.gs = gs
+        for g in self.gs:
+            g.attrs = [a for a in g.attrs if not isinstance(a, Color)]
+    def render1(self, viewer, color, transforms, linewidth):
+        for g in self.gs:
+            g.render(viewer, color, transforms)
+
+class PolyLine(Geom):
+    def __init__(self, v, close):
+        Geom.__init__(self)
+        self.v = v
+        self.close = close
+        self.linewidth = LineWidth(1)
+        self.add_attr(self.linewidth)
+    def render1(self, viewer, color, transforms, linewidth):
+        viewer.stroke(self.to_window(viewer, self.v, transforms), self.close, linewidth, color)
+    def set_linewidth(self, x):
+        self.linewidth.stroke = x
+
+class Line(Geom):
+    def __init__(self, start=(0.0, 0.0), end=(0.0, 0.0)):
+        Geom.__init__(self)
+        self.start = start
+        self.end = end
+        self.linewidth = LineWidth(1)
+        self.add_attr(self.linewidth)
+
+    def render1(self, viewer, color, transforms, linewidth):
+        viewer.stroke(self.to_window(viewer, [self.start, self.end], transforms), False, linewidth, color)
+    def set_linewidth(self, x):
+        self.linewidth.stroke = x
+
+# ================================================================
+
+# bounds, frame size and radius scale of the views drawn by
+# MultiAgentEnv.render_whole_field (passrush field) and MultiAgentEnv.render
+FIELD_VIEW = ((0, 53, 0, 120), (53*7, 120*7), 2.0)
+CAMERA_VIEW = ((-1, 1, -1, 1), (700, 700), 1.0)
+
+# (r, g, b, alpha) an entity is drawn with
+def entity_color(entity):
+    if getattr(entity, 'position', None) == 'q_back':
+        return (0, 1, 0, 0.5)
+    color = tuple(entity.color)
+    return color if len(color) == 4 else color + (1.0,)
+
+# scene of K worlds of one scenario as drawn by MultiAgentEnv: the view and
+# stacked (K, N, 2) positions, (K, N) radii, (K, N, 4) colors and (K, L, 2, 2)
+# field line segments (None without a passrush field); p_pos may be passed
+# when the positions are already stacked (e.g. batch entity arrays)
+def world_scene(worlds, p_pos=None):
+    field = hasattr(worlds[0], 'first_down_line')
+    view = FIELD_VIEW if field else CAMERA_VIEW
+    if p_pos is None:
+        p_pos = np.array([[entity.state.p_pos for entity in world.entities] for world in worlds])
+    radius = np.array([[entity.size for entity in world.entities] for world in worlds]) * view[2]
+    color = np.array([[entity_color(entity) for entity in world.entities] for world in worlds], dtype=float)
+    lines = None
+    if field:
+        line_of_scrimmage = np.array([world.line_of_scrimmage for world in worlds], dtype=float)
+        first_down_line = line_of_scrimmage + [world.first_down_line for world in worlds]
+        left, right = view[0][:2]
+        lines = np.zeros((len(worlds), 2, 2, 2))
+        lines[..., 0, 0] = left
+        lines[..., 1, 0] = right
+        lines[..., 1] = np.stack([line_of_scrimmage, first_down_line], axis=-1)[..., None]
+    return view, p_pos, radius, color, lines
+
+# renders the entities of K worlds into one (K, height, width, 3) uint8 array,
+# with the conventions of Viewer (filled circles with a darker outline, lines
+# drawn on top). Each entity is stamped into all K frames with one indexed
+# update. min_radius (in pixels) keeps small entities visible in low
+# resolution frames, e.g. minimaps used as pixel observations.
+class BatchRenderer(object):
+    def __init__(self, width, height, bounds, min_radius=0.0, outline=True):
+        self.width = width
+        self.height = height
+        left, right, bottom, top = bounds
+        assert right > left and top > bottom
+        self.origin = np.array([left, top], dtype=float)
+        self.scale = np.array([width/(right-left), -height/(top-bottom)])
+        self.min_radius = min_radius
+        self.outline = outline
+        self.frames = np.zeros((0, height, width, 3), dtype=np.uint8)
+
+    # image coordinates (column, row) of world points
+    def to_pixels(self, points):
+        return (np.asarray(points, dtype=float) - self.origin) * self.scale
+
+    # draw the scene of K worlds; the frames are a buffer overwritten by the next call unless out is given
+    def render(self, p_pos, radius, color, lines=None, line_color=(0, 0, 0), out=None):
+        k = len(p_pos)
+        if out is None:
+            if len(self.frames) != k:
+                self.frames = np.zeros((k, self.height, self.width, 3), dtype=np.uint8)
+            out = self.frames
+        out[...] = 255
+        center = self.to_pixels(p_pos)
+        radius = np.maximum(np.asarray(radius, dtype=float)[..., None] * np.abs(self.scale), self.min_radius)
+        color = np.broadcast_to(np.asarray(color, dtype=float), center.shape[:-1] + (4,))
+        for e in range(center.shape[1]):
+            self._stamp(out, center[:, e], radius[:, e], color[:, e])
+        if lines is not None:
+            for segment in np.moveaxis(self.to_pixels(lines), 1, 0):
+                self._line(out, segment, line_color)
+        return out
+
+    # filled ellipse of each world around center (K, 2) with radii (K, 2)
+    def _stamp(self, out, center, radius, color):
+        reach = int(math.ceil(radius.max())) + 1
+        offsets = np.arange(-reach, reach + 1)
+        cols = np.floor(center[:, 0]).astype(int)[:, None] + offsets
+        rows = np.floor(center[:, 1]).astype(int)[:, None] + offsets
+        dx = (cols + 0.5 - center[:, 0, None]) / radius[:, 0, None]
+        dy = (rows + 0.5 - center[:, 1, None]) / radius[:, 1, None]
+        q = np.sqrt(np.square(dy[:, :, None]) + np.square(dx[:, None, :]))
+        valid = ((rows >= 0) & (rows < self.height))[:, :, None] & ((cols >= 0) & (cols < self.width))[:, None, :]
+        self._blend(out, valid & (q <= 1), rows, cols, color)
+        if self.outline:
+            ring = valid & (np.abs(q - 1) * radius.min(axis=-1)[:, None, None] <= 0.5)
+            self._blend(out, ring, rows, cols, color * 0.5)
+
+    # one pixel wide segment (K, 2, 2) in image coordinates of each world
+    def _line(self, out, segment, color):
+        length = np.max(np.abs(segment[:, 1] - segment[:, 0]))
+        t = np.linspace(0.0, 1.0, int(math.ceil(length)) + 1)[None, :, None]
+        points = np.floor(segment[:, None, 0] + t * (segment[:, None, 1] - segment[:, None, 0])).astype(int)
+        cols, rows = points[..., 0], points[..., 1]
+        valid = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        k = np.nonzero(valid)[0]
+        out[k, rows[valid], cols[valid]] = np.rint(np.multiply(color, 255)).astype(np.uint8)
+
+    def _blend(self, out, mask, rows, cols, color):
+        k, i, j = np.nonzero(mask)
+        r, c = rows[k, i], cols[k, j]
+        alpha = color[k, 3:]
+        blended = color[k, :3] * 255 * alpha + out[k, r, c] * (1 - alpha)
+        out[k, r, c] = np.clip(np.rint(blended), 0, 255).astype(np.uint8)
@@ -0,0 +1,120 @@
+"""
+Streaming recording of rendered frames. Frames are handed to a background
+thread through a bounded queue and encoded to disk as they arrive, so
+encoding overlaps with simulation and memory use stays flat however long
+the episode is. Frames are written as a sequence of PNG files, or as a
+video (.mp4, .gif, ...) when imageio is installed.
+"""
+import os
+import struct
+import threading
+import zlib
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import numpy as np
+
+# PNG file of an (H, W, 3) uint8 frame
+def encode_png(frame, level=6):
+    frame = np.ascontiguousarray(frame, dtype=np.uint8)
+    height, width = frame.shape[:2]
+    # every scanline starts with filter type 0 (none)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = frame.reshape((height, width * 3))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) +
+            chunk(b'IEND', b''))
+
+# frames as directory/frame_000000.png, frame_000001.png, ...
+class PNGSequenceWriter(object):
+    def __init__(self, directory, level=6):
+        self.directory = directory
+        self.level = level
+        self.count = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def write(self, frame):
+        path = os.path.join(self.directory, 'frame_%06d.png' % self.count)
+        with open(path, 'wb') as f:
+            f.write(encode_png(frame, self.level))
+        self.count += 1
+
+    def close(self):
+        pass
+
+# frames as a video file written incrementally by imageio
+class VideoWriter(object):
+    def __init__(self, path, fps=30):
+        try:
+            import imageio
+        except ImportError:
+            raise ImportError("Recording to '%s' needs imageio ('pip install imageio imageio-ffmpeg'); "
+                              "record to a directory to write PNG frames without it." % path)
+        self.writer = imageio.get_writer(path, fps=fps)
+
+    def write(self, frame):
+        self.writer.append_data(np.asarray(frame, dtype=np.uint8))
+
+    def close(self):
+        self.writer.close()
+
+# records frames to path on a background thread: a path with a video
+# extension is encoded as a video, any other path is a directory of PNG frames.
+# write() blocks while queue_size frames are waiting to be encoded.
+class Recorder(object):
+    video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.gif', '.webm')
+
+    def __init__(self, path, fps=30, queue_size=64, level=6):
+        self.path = path
+        if os.path.splitext(path)[1].lower() in self.video_extensions:
+            self.writer = VideoWriter(path, fps)
+        else:
+            self.writer = PNGSequenceWriter(path, level)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.error is None:
+                try:
+                    self.writer.write(frame)
+                except Exception as e:
+                    self.error = e
+
+    # queue an (H, W, 3) uint8 frame; it must not be modified afterwards
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        assert not self.closed, 'write() called on a closed Recorder'
+        self.queue.put(frame)
+
+    # wait until all queued frames are encoded and close the output
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -29,6 +29,9 @@ import numpy as np
 
 RAD2DEG = 57.29577951308232
 
+# vertices of a Point
+_ORIGIN = ((0.0, 0.0),)
+
 def get_display(spec):
     """Convert a display specification (such as :0) into an actual Display
     object.
@@ -51,9 +54,12 @@ class Viewer(object):
 
         self.window = pyglet.window.Window(width=width, height=height, display=display)
         self.window.on_close = self.window_closed_by_user
+        self.isopen = True
         self.geoms = []
         self.onetime_geoms = []
         self.transform = Transform()
+        # vertex lists uploaded to this window's GL context, see vertex_list
+        self.vertex_lists = {}
 
         glEnable(GL_BLEND)
         # glEnable(GL_MULTISAMPLE)
@@ -64,7 +70,13 @@ class Viewer(object):
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
     def close(self):
+        if self.vertex_lists:
+            self.window.switch_to()
+            for _, vertex_list in self.vertex_lists.values():
+                vertex_list.delete()
+            self.vertex_lists = {}
         self.window.close()
+        self.isopen = False
 
     def window_closed_by_user(self):
         self.close()
@@ -83,6 +95,20 @@ class Viewer(object):
     def add_onetime(self, geom):
         self.onetime_geoms.append(geom)
 
+    # vertex list of the vertices v of geom, uploaded on first use and rebuilt
+    # only when the geom passes different vertices (geoms with fixed vertices
+    # pass the same object every frame, which skips the comparison)
+    def vertex_list(self, geom, v):
+        entry = self.vertex_lists.get(geom)
+        if entry is None or (entry[0] is not v and entry[0] != v):
+            if entry is not None:
+                entry[1].delete()
+            flat = [float(c) for p in v for c in p]
+            entry = self.vertex_lists[geom] = (v, pyglet.graphics.vertex_list(len(v), ('v2f', flat)))
+        return entry[1]
+
+    # the rgb array of the frame if return_rgb_array, otherwise whether the
+    # window is still open
     def render(self, return_rgb_array=False):
         glClearColor(1,1,1,1)
         self.window.clear()
@@ -90,9 +116,14 @@ class Viewer(object):
         self.window.dispatch_events()
         self.transform.enable()
         for geom in self.geoms:
-            geom.render()
+            geom.render(self)
+        # one-time geoms draw from vertex lists freed right after this frame
+        persistent, self.vertex_lists = self.vertex_lists, {}
         for geom in self.onetime_geoms:
-            geom.render()
+            geom.render(self)
+        onetime, self.vertex_lists = self.vertex_lists, persistent
+        for _, vertex_list in onetime.values():
+            vertex_list.delete()
         self.transform.disable()
         arr = None
         if return_rgb_array:
@@ -109,7 +140,7 @@ class Viewer(object):
             arr = arr[::-1,:,0:3]
         self.window.flip()
         self.onetime_geoms = []
-        return arr
+        return arr if return_rgb_array else self.isopen
 
     # Convenience
     def draw_circle(self, radius=10, res=30, filled=True, **attrs):
@@ -154,13 +185,13 @@ class Geom(object):
     def __init__(self):
         self._color=Color((0, 0, 0, 1.0))
         self.attrs = [self._color]
-    def render(self):
+    def render(self, viewer):
         for attr in reversed(self.attrs):
             attr.enable()
-        self.render1()
+        self.render1(viewer)
         for attr in self.attrs:
             attr.disable()
-    def render1(self):
+    def render1(self, viewer):
         raise NotImplementedError
     def add_attr(self, attr):
         self.attrs.append(attr)
@@ -216,29 +247,22 @@ class LineWidth(Attr):
 class Point(Geom):
     def __init__(self):
         Geom.__init__(self)
-    def render1(self):
-        glBegin(GL_POINTS) # draw point
-        glVertex3f(0.0, 0.0, 0.0)
-        glEnd()
+    def render1(self, viewer):
+        viewer.vertex_list(self, _ORIGIN).draw(GL_POINTS)
 
 class FilledPolygon(Geom):
     def __init__(self, v):
         Geom.__init__(self)
         self.v = v
-    def render1(self):
-        if   len(self.v) == 4 : glBegin(GL_QUADS)
-        elif len(self.v)  > 4 : glBegin(GL_POLYGON)
-        else: glBegin(GL_TRIANGLES)
-        for p in self.v:
-            glVertex3f(p[0], p[1],0)  # draw each vertex
-        glEnd()
+    def render1(self, viewer):
+        vertex_list = viewer.vertex_list(self, self.v)
+        if   len(self.v) == 4 : vertex_list.draw(GL_QUADS)
+        elif len(self.v)  > 4 : vertex_list.draw(GL_POLYGON)
+        else: vertex_list.draw(GL_TRIANGLES)
 
         color = (self._color.vec4[0] * 0.5, self._color.vec4[1] * 0.5, self._color.vec4[2] * 0.5, self._color.vec4[3] * 0.5)
         glColor4f(*color)
-        glBegin(GL_LINE_LOOP)
-        for p in self.v:
-            glVertex3f(p[0], p[1],0)  # draw each vertex
-        glEnd()
+        vertex_list.draw(GL_LINE_LOOP)
 
 def make_circle(radius=10, res=30, filled=True):
     points = []
@@ -272,9 +296,9 @@ class Compound(Geom):
         self.gs = gs
         for g in self.gs:
             g.attrs = [a for a in g.attrs if not isinstance(a, Color)]
-    def render1(self):
+    def render1(self, viewer):
         for g in self.gs:
-            g.render()
+            g.render(viewer)
 
 class PolyLine(Geom):
     def __init__(self, v, close):
@@ -283,11 +307,8 @@ class PolyLine(Geom):
         self.close = close
         self.linewidth = LineWidth(1)
         self.add_attr(self.linewidth)
-    def render1(self):
-        glBegin(GL_LINE_LOOP if self.close else GL_LINE_STRIP)
-        for p in self.v:
-            glVertex3f(p[0], p[1],0)  # draw each vertex
-        glEnd()
+    def render1(self, viewer):
+        viewer.vertex_list(self, self.v).draw(GL_LINE_LOOP if self.close else GL_LINE_STRIP)
     def set_linewidth(self, x):
         self.linewidth.stroke = x
 
@@ -299,11 +320,8 @@ class Line(Geom):
         self.linewidth = LineWidth(1)
         self.add_attr(self.linewidth)
 
-    def render1(self):
-        glBegin(GL_LINES)
-        glVertex2f(*self.start)
-        glVertex2f(*self.end)
-        glEnd()
+    def render1(self, viewer):
+        viewer.vertex_list(self, (tuple(self.start), tuple(self.end))).draw(GL_LINES)
 
 class Image(Geom):
     def __init__(self, fname, width, height):
@@ -313,7 +331,7 @@ class Image(Geom):
         img = pyglet.image.load(fname)
         self.img = img
         self.flip = False
-    def render1(self):
+    def render1(self, viewer):
         self.img.blit(-self.width/2, -self.height/2, width=self.width, height=self.height)
 
 # ================================================================
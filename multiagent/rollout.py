@@ -0,0 +1,111 @@
+"""
+Lookahead rollouts from a given state. A RolloutEngine keeps a batch of
+copies of a scenario (see batch_environment.BatchedMultiAgentEnv). To
+evaluate candidate actions it loads one world state into every copy, takes
+each candidate in an equal share of the copies, follows the supplied policy
+for a fixed horizon with batched physics and averages the discounted
+returns, which include the final rewards of the play's outcome (see
+termination). Values can drive scripted agents through action_callback.
+"""
+import numpy as np
+from multiagent.batch_environment import BatchedMultiAgentEnv
+from multiagent.core import Action
+from multiagent.termination import NOT_DONE
+
+# entity properties reset_world may randomize, copied from the source world
+# into the rollout worlds along with its state
+PROPERTIES = ('size', 'movable', 'collide', 'initial_mass', 'max_speed', 'accel',
+              'u_noise', 'c_noise', 'silent', 'color')
+
+class RolloutEngine(object):
+    def __init__(self, scenario, n_rollouts, horizon=20, gamma=0.99, seed=None):
+        self.env = BatchedMultiAgentEnv(scenario, n_rollouts, auto_reset=False)
+        self.env.seed(seed)
+        self.env.reset()
+        self.n_rollouts = n_rollouts
+        self.horizon = horizon
+        self.gamma = gamma
+        self.n = self.env.n
+        # rows of the rollout worlds' policy agents in world.agents
+        self.policy_index = self.env.policy_index
+
+    # copy the properties and state of world into every rollout world; each
+    # rollout world keeps its own random stream so the rollouts differ
+    def load(self, world):
+        state = world.get_state()
+        for k, rollout in enumerate(self.env.worlds):
+            for source, entity in zip(world.entities, rollout.entities):
+                for name in PROPERTIES:
+                    if hasattr(source, name):
+                        setattr(entity, name, getattr(source, name))
+            rng_state = rollout.np_random.bit_generator.state
+            rollout.set_state(state)
+            rollout.np_random.bit_generator.state = rng_state
+            rollout.invalidate_arrays()
+            self.env._sync_world(k)
+
+    # mean discounted returns (C, n) of the policy agents for each of the C
+    # candidate joint actions (C, n, act_dim) taken in the state of world,
+    # following policy(obs (K, n, obs_dim)) -> (K, n, act_dim) afterwards
+    def evaluate(self, world, candidates, policy, horizon=None):
+        candidates = np.asarray(candidates, dtype=float)
+        self.load(world)
+        which = self._assign(len(candidates))
+        return self._rollout(candidates[which], which, len(candidates), policy, horizon)
+
+    # mean discounted returns (C,) of agent i (index into world.agents) for
+    # each of its C candidate actions (C, act_dim), all other agents following
+    # policy from the start
+    def evaluate_agent(self, world, i, candidates, policy, horizon=None):
+        j = np.flatnonzero(self.policy_index == i)
+        assert len(j), 'agent %d is scripted in the rollout worlds' % i
+        candidates = np.asarray(candidates, dtype=float)
+        self.load(world)
+        which = self._assign(len(candidates))
+        actions = np.array(policy(self.env._get_obs()), dtype=float)
+        actions[:, j[0]] = candidates[which]
+        return self._rollout(actions, which, len(candidates), policy, horizon)[:, j[0]]
+
+    # Agent.action_callback taking, at every step, the candidate action
+    # (C, act_dim) with the best estimated value for the agent
+    def action_callback(self, candidates, policy, horizon=None):
+        candidates = np.asarray(candidates, dtype=float)
+        decoder = self.env.env.action_decoder
+        assert decoder.uniform, 'action_callback needs agents with one action layout'
+
+        def callback(agent, world):
+            i = world.agents.index(agent)
+            values = self.evaluate_agent(world, i, candidates, policy, horizon)
+            j = int(np.flatnonzero(self.policy_index == i)[0])
+            joint = np.zeros((self.n, candidates.shape[-1]))
+            joint[j] = candidates[int(np.argmax(values))]
+            sensitivity = np.full(self.n, 5.0 if agent.accel is None else agent.accel)
+            u, c = decoder.decode(joint, sensitivity)
+            action = Action()
+            action.u = u[j]
+            action.c = c[j]
+            return action
+        return callback
+
+    # candidate taken by each rollout world
+    def _assign(self, n_candidates):
+        assert self.n_rollouts >= n_candidates, 'fewer rollouts than candidates'
+        return np.arange(self.n_rollouts) % n_candidates
+
+    def _rollout(self, actions, which, n_candidates, policy, horizon):
+        returns = np.zeros((self.n_rollouts, self.n))
+        running = np.ones(self.n_rollouts, dtype=bool)
+        discount = 1.0
+        for t in range(self.horizon if horizon is None else horizon):
+            if t > 0:
+                actions = np.asarray(policy(obs_n), dtype=float)
+            obs_n, reward_n, done_n, _ = self.env.step(actions)
+            # rewards of a world count until (and including) the step its play ends
+            returns += discount * reward_n * running[:, None]
+            running &= ~np.all(done_n != NOT_DONE, axis=1)
+            discount *= self.gamma
+            if not running.any():
+                break
+        values = np.zeros((n_candidates, self.n))
+        np.add.at(values, which, returns)
+        return values / np.bincount(which, minlength=n_candidates)[:, None]
@@ -8,3 +8,23 @@ class BaseScenario(object):
     # create initial conditions of the world
     def reset_world(self, world):
         raise NotImplementedError()
+
+    # observation builder of the scenario (see observation.ObservationBuilder)
+    observer = None
+
+    # build the observation builder for the world
+    def make_observer(self, world):
+        raise NotImplementedError()
+
+    # the observation builder, made again from the world after unpickling
+    def get_observer(self, world):
+        if self.observer is None:
+            self.observer = self.make_observer(world)
+        return self.observer
+
+    # observation builders hold closures, so they are left out when the
+    # scenario is pickled (e.g. for spawned worker processes)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('observer', None)
+        return state
@@ -1,7 +1,99 @@
-import imp
+"""
+Scenario registry. A scenario is a module defining a Scenario class: the
+modules of this package, those other packages register under the
+'multiagent.scenarios' entry point group (name = module) and any added with
+register(). Scenarios are found lazily on first use and imported once under
+stable module names, so scenario objects pickle and load in processes
+started with the spawn method.
+"""
+import ast
+import importlib
+import importlib.util
 import os.path as osp
+import pkgutil
+import sys
+import zlib
 
+ENTRY_POINT_GROUP = 'multiagent.scenarios'
 
+# modules of this package that are not scenarios
+_HELPERS = ('constants',)
+
+# scenario name -> module name, built on first use
+_registry = None
+
+# modules loaded from scenario scripts outside the registry, by path
+_scripts = {}
+
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return [(ep.name, ep.module_name) for ep in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP)]
+    eps = entry_points()
+    eps = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, 'select') else eps.get(ENTRY_POINT_GROUP, [])
+    return [(ep.name, ep.value.split(':')[0]) for ep in eps]
+
+def _discover():
+    global _registry
+    if _registry is None:
+        registry = dict(_entry_points())
+        # the scenarios of this package take precedence
+        for _, name, ispkg in pkgutil.iter_modules(__path__):
+            if not ispkg and name not in _HELPERS:
+                registry[name] = __name__ + '.' + name
+        _registry = registry
+    return _registry
+
+# add (or replace) the scenario name, defined by the module of that name
+def register(name, module):
+    _discover()[name] = module
+
+# names of all known scenarios
+def names():
+    return sorted(_discover())
+
+# make_world keyword arguments from 'key=value' strings (e.g. given on the
+# command line); values are Python literals, or strings if they do not parse
+def world_kwargs(pairs):
+    kwargs = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError('expected key=value, got %r' % pair)
+        try:
+            kwargs[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            kwargs[key] = value
+    return kwargs
+
+# the module of a scenario, given its name (with or without '.py') or the
+# path of a scenario script
 def load(name):
-    pathname = osp.join(osp.dirname(__file__), name)
-    return imp.load_source('', pathname)
+    registry = _discover()
+    key = osp.basename(name)
+    key = key[:-3] if key.endswith('.py') else key
+    in_package = osp.dirname(osp.abspath(name)) == osp.dirname(osp.abspath(__file__))
+    if key in registry and (osp.dirname(name) == '' or in_package):
+        return importlib.import_module(registry[key])
+    if osp.isfile(name):
+        return _load_script(name)
+    raise KeyError('unknown scenario %r (known scenarios: %s)' % (name, ', '.join(names())))
+
+# import a scenario script outside the package under a name derived from its
+# path; its objects pickle within the process and forked workers only
+def _load_script(path):
+    path = osp.abspath(path)
+    if path not in _scripts:
+        stem = osp.splitext(osp.basename(path))[0]
+        module_name = 'multiagent_scenario_%s_%08x' % (stem, zlib.crc32(path.encode()) & 0xffffffff)
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        _scripts[path] = module
+    return _scripts[path]
@@ -1,4 +1,9 @@
 D_LINE = 'd_line'
 O_LINE = 'o_line'
 Q_BACK = 'q_back'
+RECEIVER = 'receiver'
+D_BACK = 'd_back'
 
+# positions of each team
+OFFENSE = (O_LINE, Q_BACK, RECEIVER)
+DEFENSE = (D_LINE, D_BACK)
@@ -1,120 +1,158 @@
 import numpy as np
 from multiagent.core import World, Agent, Landmark
 from multiagent.scenario import BaseScenario
-from multiagent.scenarios.constants import D_LINE, O_LINE, Q_BACK
+from multiagent.observation import ObservationBuilder
+from multiagent.scenarios.constants import D_LINE, O_LINE, Q_BACK, RECEIVER, D_BACK, OFFENSE, DEFENSE
 
 # D_LINE = 'd_line'
 # O_LINE = 'o_line'
 # Q_BACK = 'q_back'
 
+# roster of full 11-on-11 teams: five linemen, a quarterback and five
+# receivers against four linemen and seven defensive backs
+FULL_TEAMS = {
+    'num_offensive_linemen': 5,
+    'num_defensive_linemen': 4,
+    'num_receivers': 5,
+    'num_defensive_backs': 7,
+}
+
 class Scenario(BaseScenario):
 
-    def make_world(self):
+    # roster sizes and field dimensions (in yards) are configurable; k_nearest
+    # limits each agent's observation to its k nearest teammates and k
+    # nearest opponents instead of all other players
+    def make_world(self, num_offensive_linemen=5, num_defensive_linemen=7, num_receivers=0,
+                   num_defensive_backs=0, field_width=53, field_length=120, line_of_scrimmage=60,
+                   k_nearest=None):
+        self.k_nearest = k_nearest
         world = World()
         # set any world properties first
         world.dim_c = 2
-        num_offensive_linemen = 5 # Offensive linemen
-        num_defensive_linemen = 7 # Defensive linemen
         num_quarterback = 1
-        world.num_agents = num_offensive_linemen + num_defensive_linemen + num_quarterback
-        world.borders = [[0,0], [53,120]]
-        world.line_of_scrimmage = 60
-
-        # Add defensive linemen
-        d_line = [Agent() for i in range(num_defensive_linemen)]
-        for i, d in enumerate(d_line):
-            d.name = 'agent %d' % i
-            d.collide = True # TODO: INVESTIGATE THIS VAL
-            d.silent = True
-            d.position = D_LINE
-            d.size = 0.15 # TODO: INVESTIGATE THIS VAL
-            d.in_bounds = True
-            d.is_done = False
-            d.color = np.array([0.25, 0.25, 0.25])
-            world.agents.append(d)
-            # world.policy_agents.append(d)
-
-        # Add offensive linemen
-        o_line = [Agent() for i in range(num_offensive_linemen)]
-        for i, o in enumerate(o_line):
-            o.name = 'agent %d' % (i + num_defensive_linemen)
-            o.collide = True # TODO: INVESTIGATE THIS VAL
-            o.silent = True
-            o.position = O_LINE
-            o.size = 0.15 # TODO: INVESTIGATE THIS VAL
-            o.in_bounds = True
-            o.is_done = False
-            o.color = np.array([0.75, 0.25, 0.25])
-            world.agents.append(o)
-            # world.policy_agents.append(o)
-
-        # Add quarterback
-        q_back = Agent()
-        q_back.name = 'agent %d' % (num_defensive_linemen + num_offensive_linemen)
-        q_back.collide = True # TODO: INVESTIGATE THIS VAL
-        q_back.silent = True
-        q_back.position = Q_BACK
-        q_back.size = 0.15
-        q_back.in_bounds = True
-        q_back.is_done = False
-        q_back.color = np.array([0.25, 0.25, 0.75])
-        world.agents.append(q_back)
-        # world.policy_agents.append(q_back)
+        world.num_agents = (num_offensive_linemen + num_defensive_linemen + num_quarterback +
+                            num_receivers + num_defensive_backs)
+        world.borders = [[0,0], [field_width,field_length]]
+        world.line_of_scrimmage = line_of_scrimmage
+
+        # Add defensive linemen, offensive linemen, quarterback, receivers and
+        # defensive backs, in this order
+        roster = [
+            (D_LINE, num_defensive_linemen, np.array([0.25, 0.25, 0.25])),
+            (O_LINE, num_offensive_linemen, np.array([0.75, 0.25, 0.25])),
+            (Q_BACK, num_quarterback, np.array([0.25, 0.25, 0.75])),
+            (RECEIVER, num_receivers, np.array([0.85, 0.45, 0.25])),
+            (D_BACK, num_defensive_backs, np.array([0.45, 0.45, 0.45])),
+        ]
+        for position, count, color in roster:
+            for i in range(count):
+                agent = Agent()
+                agent.name = 'agent %d' % len(world.agents)
+                agent.collide = True # TODO: INVESTIGATE THIS VAL
+                agent.silent = True
+                agent.position = position
+                agent.size = 0.15 # TODO: INVESTIGATE THIS VAL
+                agent.in_bounds = True
+                agent.is_done = False
+                agent.color = color.copy()
+                world.agents.append(agent)
+
+        self.observer = self.make_observer(world)
 
         # make initial conditions
         self.reset_world(world)
         return world
 
+    def make_observer(self, world):
+        if self.k_nearest is None:
+            # every agent observes the positions of all other players
+            return ObservationBuilder(world).others('p_pos')
+        # teammates first, then opponents, each followed by a mask of the
+        # neighbors found
+        offense = np.concatenate([world.roles.index(position) for position in OFFENSE])
+        defense = np.concatenate([world.roles.index(position) for position in DEFENSE])
+        observer = ObservationBuilder(world)
+        for team, opponents in ((offense, defense), (defense, offense)):
+            observer.layout(team).nearest(self.k_nearest, among=team, mask=True)
+            observer.nearest(self.k_nearest, among=opponents, mask=True)
+        return observer
+
+    # x coordinate uniformly spread around center over a span (in yards) that
+    # widens with the number of players sharing it
+    def spread(self, world, center, span, count):
+        span = max(span, count)
+        return world.np_random.uniform(center - span / 2.0, center + span / 2.0)
+
     def reset_world(self, world):
         # random properties for agents
 
         # random properties for landmarks
         
         # set random initial states
+        field_width = world.borders[1][0]
+        # the lines set up around the middle of the field (between the hashes)
+        center = field_width / 2.0 - 1.0
+        count = {position: len(world.roles.index(position)) for position in OFFENSE + DEFENSE}
         for agent in world.agents:
             if (agent.position == D_LINE):
                 y = world.line_of_scrimmage + 0.5
-                x = np.random.uniform(21, 30) # TODO: As far as I can tell, this places them all between the hashes
+                x = self.spread(world, center, 9, count[D_LINE]) # TODO: As far as I can tell, this places them all between the hashes
                 agent.state.p_pos = np.array([x, y])
-                agent.accel = np.random.uniform(3.0, 4.0)
-                agent.max_speed = np.random.uniform(1.0, 1.2)
+                agent.accel = world.np_random.uniform(3.0, 4.0)
+                agent.max_speed = world.np_random.uniform(1.0, 1.2)
             elif (agent.position == O_LINE):
                 y = world.line_of_scrimmage - 0.5
-                x = np.random.uniform(23, 28)
+                x = self.spread(world, center, 5, count[O_LINE])
                 agent.state.p_pos = np.array([x, y])
-                agent.accel = np.random.uniform(3.0, 4.0)
-                agent.max_speed = np.random.uniform(1.0, 1.2)
+                agent.accel = world.np_random.uniform(3.0, 4.0)
+                agent.max_speed = world.np_random.uniform(1.0, 1.2)
             elif (agent.position == Q_BACK):
-                y = world.line_of_scrimmage - np.random.uniform(5, 10) # THESE ARE RANDOMLY CHOSEN BOUNDS
-                x = 26
+                y = world.line_of_scrimmage - world.np_random.uniform(5, 10) # THESE ARE RANDOMLY CHOSEN BOUNDS
+                x = center + 0.5
+                agent.state.p_pos = np.array([x, y])
+                agent.completion_percentage = world.np_random.uniform(0.5, 1)
+                agent.accel = world.np_random.uniform(3.0, 4.0)
+                agent.max_speed = world.np_random.uniform(1.0, 1.2)
+            elif (agent.position == RECEIVER):
+                # split out across the field, on the line of scrimmage
+                y = world.line_of_scrimmage - 0.5
+                x = world.np_random.uniform(3, field_width - 3)
                 agent.state.p_pos = np.array([x, y])
-                agent.completion_percentage = np.random.uniform(0.5, 1)
-                agent.accel = np.random.uniform(3.0, 4.0)
-                agent.max_speed = np.random.uniform(1.0, 1.2)
+                agent.accel = world.np_random.uniform(3.5, 4.5)
+                agent.max_speed = world.np_random.uniform(1.2, 1.5)
+            elif (agent.position == D_BACK):
+                # in coverage, 5 to 15 yards off the line of scrimmage
+                y = world.line_of_scrimmage + world.np_random.uniform(5, 15)
+                x = world.np_random.uniform(3, field_width - 3)
+                agent.state.p_pos = np.array([x, y])
+                agent.accel = world.np_random.uniform(3.5, 4.5)
+                agent.max_speed = world.np_random.uniform(1.2, 1.5)
             agent.is_done = False
             agent.in_bounds = True
             agent.state.p_vel = np.zeros(world.dim_p)
             agent.state.c = np.zeros(world.dim_c)
 
-        world.first_down_line = np.random.uniform(2, 20)
-        world.timeout = np.random.uniform(400, 600)
+        world.first_down_line = world.np_random.uniform(2, 20)
+        world.timeout = world.np_random.uniform(400, 600)
         world.time = 0
 
 
     # return all offensive players
     def offensive_agents(self, world):
-        return [agent for agent in world.agents if ((agent.position == Q_BACK or agent.position == O_LINE) and agent.in_bounds and not agent.is_done)]
+        players = [agent for position in OFFENSE for agent in world.roles.position(position)]
+        return [agent for agent in players if (agent.in_bounds and not agent.is_done)]
 
     # return all defensive players
     def defensive_agents(self, world):
-        return [agent for agent in world.agents if (agent.position == D_LINE and agent.in_bounds and not agent.is_done)]
+        players = [agent for position in DEFENSE for agent in world.roles.position(position)]
+        return [agent for agent in players if (agent.in_bounds and not agent.is_done)]
 
     def reward(self, agent, world):
         # Agents are rewarded based on minimum agent distance to each landmark
         if (agent.in_bounds):
-            if (agent.position == D_LINE):
+            if (agent.position in DEFENSE):
                 return self.defensive_line_reward(agent, world)
-            elif (agent.position == O_LINE):
+            elif (agent.position in (O_LINE, RECEIVER)):
                 return self.offensive_line_reward(agent, world)
             elif (agent.position == Q_BACK):
                 return self.offensive_line_reward(agent, world) # DO I NEED SOMETHING DIFFERENT?
@@ -172,27 +210,28 @@ class Scenario(BaseScenario):
         # Should observe 
         #   Position between itself and other players
         #   Position to boundaries/on field?
+        return self.get_observer(world).observe(agent, world)
 
-        other_pos = []
-        for other in world.agents:
-            if (other is agent):
-                continue
-            other_pos.append(other.state.p_pos - agent.state.p_pos)
-
-        # if (len(other_pos)):
-        return np.concatenate(other_pos)
-        # return np.array([])
-        # return other_pos
+    # observations of all agents (or those at rows) at once from entity arrays
+    # with any leading axes
+    def observation_batch(self, world, arrays, out=None, rows=None):
+        return self.get_observer(world).build(arrays, rows=rows, out=out, world=world)
 
+    # rewards of all agents at once from entity arrays with any leading axes
+    def reward_batch(self, world, arrays):
+        role_reward = np.ones(len(world.agents))
+        for position in DEFENSE:
+            role_reward[world.roles.index(position)] = -1.0
+        return np.where(arrays.in_bounds, role_reward, -10.0)
 
     def benchmark_data(self, agent, world):
         # returns data for benchmarking purposes
-        if agent.position == D_LINE:
-            # Benchmark the position from each D_LINE to Q_BACK
-            q_back = world.get_agents().filter(lambda x: x.position == Q_BACK)
+        if agent.position in DEFENSE:
+            # Benchmark the position from each defender to Q_BACK
+            q_back = world.roles.first(Q_BACK)
             return np.sum(np.square(q_back.state.p_pos - agent.state.p_pos))
         elif agent.position == Q_BACK:
             return world.line_of_scrimmage - agent.state.p_pos[1]
-        elif agent.position == O_LINE:
-            q_back = world.get_agents().filter(lambda x: x.position == Q_BACK)
+        elif agent.position in (O_LINE, RECEIVER):
+            q_back = world.roles.first(Q_BACK)
             return np.sum(np.square(q_back.state.p_pos - agent.state.p_pos))
@@ -1,15 +1,18 @@
 import numpy as np
 from multiagent.core import World, Agent, Landmark
 from multiagent.scenario import BaseScenario
+from multiagent.observation import ObservationBuilder
 
 
 class Scenario(BaseScenario):
-    def make_world(self):
+    # with k_nearest set, agents observe only their k nearest other agents
+    # (and a mask of those found) instead of all of them
+    def make_world(self, num_agents=3, k_nearest=None):
+        self.k_nearest = k_nearest
         world = World()
         # set any world properties first
         world.dim_c = 2
-        num_agents = 3
-        num_landmarks = 3
+        num_landmarks = num_agents
         world.collaborative = True
         # add agents
         world.agents = [Agent() for i in range(num_agents)]
@@ -24,10 +27,24 @@ class Scenario(BaseScenario):
             landmark.name = 'landmark %d' % i
             landmark.collide = False
             landmark.movable = False
+        self.observer = self.make_observer(world)
         # make initial conditions
         self.reset_world(world)
         return world
 
+    # own velocity and position, landmarks relative to the agent, then the
+    # positions (relative to the agent) and communication of the other agents
+    def make_observer(self, world):
+        num_agents = len(world.agents)
+        observer = ObservationBuilder(world)
+        observer.own('p_vel').own('p_pos')
+        observer.entities(range(num_agents, num_agents + len(world.landmarks)))
+        if self.k_nearest is None:
+            observer.others('p_pos').others('c')
+        else:
+            observer.nearest(self.k_nearest).nearest(self.k_nearest, fields=('c',), mask=True)
+        return observer
+
     def reset_world(self, world):
         # random properties for agents
         for i, agent in enumerate(world.agents):
@@ -37,11 +54,11 @@ class Scenario(BaseScenario):
             landmark.color = np.array([0.25, 0.25, 0.25])
         # set random initial states
         for agent in world.agents:
-            agent.state.p_pos = np.random.uniform(-1, +1, world.dim_p)
+            agent.state.p_pos = world.np_random.uniform(-1, +1, world.dim_p)
             agent.state.p_vel = np.zeros(world.dim_p)
             agent.state.c = np.zeros(world.dim_c)
         for i, landmark in enumerate(world.landmarks):
-            landmark.state.p_pos = np.random.uniform(-1, +1, world.dim_p)
+            landmark.state.p_pos = world.np_random.uniform(-1, +1, world.dim_p)
             landmark.state.p_vel = np.zeros(world.dim_p)
 
     def benchmark_data(self, agent, world):
@@ -82,19 +99,9 @@ class Scenario(BaseScenario):
         return rew
 
     def observation(self, agent, world):
-        # get positions of all entities in this agent's reference frame
-        entity_pos = []
-        for entity in world.landmarks:  # world.entities:
-            entity_pos.append(entity.state.p_pos - agent.state.p_pos)
-        # entity colors
-        entity_color = []
-        for entity in world.landmarks:  # world.entities:
-            entity_color.append(entity.color)
-        # communication of all other agents
-        comm = []
-        other_pos = []
-        for other in world.agents:
-            if other is agent: continue
-            comm.append(other.state.c)
-            other_pos.append(other.state.p_pos - agent.state.p_pos)
-        return np.concatenate([agent.state.p_vel] + [agent.state.p_pos] + entity_pos + other_pos + comm)
+        return self.get_observer(world).observe(agent, world)
+
+    # observations of all agents (or those at rows) at once from entity arrays
+    # with any leading axes
+    def observation_batch(self, world, arrays, out=None, rows=None):
+        return self.get_observer(world).build(arrays, rows=rows, out=out, world=world)
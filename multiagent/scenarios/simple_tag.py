@@ -1,10 +1,14 @@
 import numpy as np
 from multiagent.core import World, Agent, Landmark
 from multiagent.scenario import BaseScenario
+from multiagent.observation import ObservationBuilder
 
 
 class Scenario(BaseScenario):
-    def make_world(self):
+    # with k_nearest set, agents observe only their k nearest adversaries and
+    # k nearest good agents instead of all other agents
+    def make_world(self, k_nearest=None):
+        self.k_nearest = k_nearest
         world = World()
         # set any world properties first
         world.dim_c = 2
@@ -31,10 +35,28 @@ class Scenario(BaseScenario):
             landmark.movable = False
             landmark.size = 0.2
             landmark.boundary = False
+        self.observer = self.make_observer(world)
         # make initial conditions
         self.reset_world(world)
         return world
 
+    # own velocity and position, landmarks and other agents relative to
+    # the agent, and velocities of the other good agents
+    def make_observer(self, world):
+        num_agents = len(world.agents)
+        observer = ObservationBuilder(world)
+        observer.own('p_vel').own('p_pos')
+        observer.entities([num_agents + i for i, l in enumerate(world.landmarks) if not l.boundary])
+        good = [i for i, a in enumerate(world.agents) if not a.adversary]
+        if self.k_nearest is None:
+            observer.others('p_pos')
+            observer.others('p_vel', among=good)
+        else:
+            adversaries = [i for i, a in enumerate(world.agents) if a.adversary]
+            observer.nearest(self.k_nearest, among=adversaries, mask=True)
+            observer.nearest(self.k_nearest, among=good, fields=('p_pos', 'p_vel'), mask=True)
+        return observer
+
 
     def reset_world(self, world):
         # random properties for agents
@@ -45,12 +67,12 @@ class Scenario(BaseScenario):
             landmark.color = np.array([0.25, 0.25, 0.25])
         # set random initial states
         for agent in world.agents:
-            agent.state.p_pos = np.random.uniform(-1, +1, world.dim_p)
+            agent.state.p_pos = world.np_random.uniform(-1, +1, world.dim_p)
             agent.state.p_vel = np.zeros(world.dim_p)
             agent.state.c = np.zeros(world.dim_c)
         for i, landmark in enumerate(world.landmarks):
             if not landmark.boundary:
-                landmark.state.p_pos = np.random.uniform(-0.9, +0.9, world.dim_p)
+                landmark.state.p_pos = world.np_random.uniform(-0.9, +0.9, world.dim_p)
                 landmark.state.p_vel = np.zeros(world.dim_p)
 
 
@@ -74,11 +96,11 @@ class Scenario(BaseScenario):
 
     # return all agents that are not adversaries
     def good_agents(self, world):
-        return [agent for agent in world.agents if not agent.adversary]
+        return world.roles.good_agents
 
     # return all adversarial agents
     def adversaries(self, world):
-        return [agent for agent in world.agents if agent.adversary]
+        return world.roles.adversaries
 
 
     def reward(self, agent, world):
@@ -130,18 +152,9 @@ class Scenario(BaseScenario):
 
     def observation(self, agent, world):
         # get positions of all entities in this agent's reference frame
-        entity_pos = []
-        for entity in world.landmarks:
-            if not entity.boundary:
-                entity_pos.append(entity.state.p_pos - agent.state.p_pos)
-        # communication of all other agents
-        comm = []
-        other_pos = []
-        other_vel = []
-        for other in world.agents:
-            if other is agent: continue
-            comm.append(other.state.c)
-            other_pos.append(other.state.p_pos - agent.state.p_pos)
-            if not other.adversary:
-                other_vel.append(other.state.p_vel)
-        return np.concatenate([agent.state.p_vel] + [agent.state.p_pos] + entity_pos + other_pos + other_vel)
+        return self.get_observer(world).observe(agent, world)
+
+    # observations of all agents (or those at rows) at once from entity arrays
+    # with any leading axes
+    def observation_batch(self, world, arrays, out=None, rows=None):
+        return self.get_observer(world).build(arrays, rows=rows, out=out, world=world)
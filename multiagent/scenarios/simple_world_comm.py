@@ -1,6 +1,7 @@
 import numpy as np
 from multiagent.core import World, Agent, Landmark
 from multiagent.scenario import BaseScenario
+from multiagent.observation import ObservationBuilder, touching
 
 
 class Scenario(BaseScenario):
@@ -52,10 +53,48 @@ class Scenario(BaseScenario):
         world.landmarks += world.food
         world.landmarks += world.forests
         #world.landmarks += self.set_boundaries(world)  # world boundaries now penalized with negative reward
+        self.observer = self.make_observer(world)
         # make initial conditions
         self.reset_world(world)
         return world
 
+    # adversaries observe own state, landmarks, other agents, velocities of good
+    # agents, whether they are in a forest and the leader's communication;
+    # good agents observe the same without communication and with the
+    # velocities last. Agents in a forest are only seen from the same forest,
+    # and the leader sees everyone.
+    def make_observer(self, world):
+        num_agents = len(world.agents)
+        agents = range(num_agents)
+        adversaries = [i for i in agents if world.agents[i].adversary]
+        good = [i for i in agents if not world.agents[i].adversary]
+        leaders = np.array([agent.leader for agent in world.agents])
+        landmarks = [num_agents + i for i, l in enumerate(world.landmarks) if not l.boundary]
+        forests = [num_agents + world.landmarks.index(f) for f in world.forests]
+
+        def in_forest(ctx):
+            return touching(ctx.arrays, np.arange(num_agents), forests)
+
+        def visible(ctx):
+            inf = ctx.cached(in_forest)
+            inf_self = inf[..., ctx.rows, None, :]
+            inf_other = inf[..., None, :, :]
+            same_forest = np.any(inf_self & inf_other, axis=-1)
+            no_forest = ~np.any(inf_self, axis=-1) & ~np.any(inf_other, axis=-1)
+            return same_forest | no_forest | leaders[ctx.rows, None]
+
+        def forest_flags(ctx, rows, sel):
+            return np.where(ctx.cached(in_forest)[..., rows, :], 1.0, -1.0)
+
+        observer = ObservationBuilder(world)
+        observer.layout(adversaries).own('p_vel').own('p_pos').entities(landmarks)
+        observer.others('p_pos', mask=visible).others('p_vel', among=good, mask=visible)
+        observer.add(len(forests), forest_flags).agent('c', 0)
+        observer.layout(good).own('p_vel').own('p_pos').entities(landmarks)
+        observer.others('p_pos', mask=visible).add(len(forests), forest_flags)
+        observer.others('p_vel', among=good, mask=visible)
+        return observer
+
     def set_boundaries(self, world):
         boundary_list = []
         landmark_size = 1
@@ -99,17 +138,17 @@ class Scenario(BaseScenario):
             landmark.color = np.array([0.6, 0.9, 0.6])
         # set random initial states
         for agent in world.agents:
-            agent.state.p_pos = np.random.uniform(-1, +1, world.dim_p)
+            agent.state.p_pos = world.np_random.uniform(-1, +1, world.dim_p)
             agent.state.p_vel = np.zeros(world.dim_p)
             agent.state.c = np.zeros(world.dim_c)
         for i, landmark in enumerate(world.landmarks):
-            landmark.state.p_pos = np.random.uniform(-0.9, +0.9, world.dim_p)
+            landmark.state.p_pos = world.np_random.uniform(-0.9, +0.9, world.dim_p)
             landmark.state.p_vel = np.zeros(world.dim_p)
         for i, landmark in enumerate(world.food):
-            landmark.state.p_pos = np.random.uniform(-0.9, +0.9, world.dim_p)
+            landmark.state.p_pos = world.np_random.uniform(-0.9, +0.9, world.dim_p)
             landmark.state.p_vel = np.zeros(world.dim_p)
         for i, landmark in enumerate(world.forests):
-            landmark.state.p_pos = np.random.uniform(-0.9, +0.9, world.dim_p)
+            landmark.state.p_pos = world.np_random.uniform(-0.9, +0.9, world.dim_p)
             landmark.state.p_vel = np.zeros(world.dim_p)
 
     def benchmark_data(self, agent, world):
@@ -132,11 +171,11 @@ class Scenario(BaseScenario):
 
     # return all agents that are not adversaries
     def good_agents(self, world):
-        return [agent for agent in world.agents if not agent.adversary]
+        return world.roles.good_agents
 
     # return all adversarial agents
     def adversaries(self, world):
-        return [agent for agent in world.agents if agent.adversary]
+        return world.roles.adversaries
 
 
     def reward(self, agent, world):
@@ -223,67 +262,9 @@ class Scenario(BaseScenario):
 
     def observation(self, agent, world):
         # get positions of all entities in this agent's reference frame
-        entity_pos = []
-        for entity in world.landmarks:
-            if not entity.boundary:
-                entity_pos.append(entity.state.p_pos - agent.state.p_pos)
-
-        in_forest = [np.array([-1]), np.array([-1])]
-        inf1 = False
-        inf2 = False
-        if self.is_collision(agent, world.forests[0]):
-            in_forest[0] = np.array([1])
-            inf1= True
-        if self.is_collision(agent, world.forests[1]):
-            in_forest[1] = np.array([1])
-            inf2 = True
-
-        food_pos = []
-        for entity in world.food:
-            if not entity.boundary:
-                food_pos.append(entity.state.p_pos - agent.state.p_pos)
-        # communication of all other agents
-        comm = []
-        other_pos = []
-        other_vel = []
-        for other in world.agents:
-            if other is agent: continue
-            comm.append(other.state.c)
-            oth_f1 = self.is_collision(other, world.forests[0])
-            oth_f2 = self.is_collision(other, world.forests[1])
-            if (inf1 and oth_f1) or (inf2 and oth_f2) or (not inf1 and not oth_f1 and not inf2 and not oth_f2) or agent.leader:  #without forest vis
-                other_pos.append(other.state.p_pos - agent.state.p_pos)
-                if not other.adversary:
-                    other_vel.append(other.state.p_vel)
-            else:
-                other_pos.append([0, 0])
-                if not other.adversary:
-                    other_vel.append([0, 0])
-
-        # to tell the pred when the prey are in the forest
-        prey_forest = []
-        ga = self.good_agents(world)
-        for a in ga:
-            if any([self.is_collision(a, f) for f in world.forests]):
-                prey_forest.append(np.array([1]))
-            else:
-                prey_forest.append(np.array([-1]))
-        # to tell leader when pred are in forest
-        prey_forest_lead = []
-        for f in world.forests:
-            if any([self.is_collision(a, f) for a in ga]):
-                prey_forest_lead.append(np.array([1]))
-            else:
-                prey_forest_lead.append(np.array([-1]))
-
-        comm = [world.agents[0].state.c]
-
-        if agent.adversary and not agent.leader:
-            return np.concatenate([agent.state.p_vel] + [agent.state.p_pos] + entity_pos + other_pos + other_vel + in_forest + comm)
-        if agent.leader:
-            return np.concatenate(
-                [agent.state.p_vel] + [agent.state.p_pos] + entity_pos + other_pos + other_vel + in_forest + comm)
-        else:
-            return np.concatenate([agent.state.p_vel] + [agent.state.p_pos] + entity_pos + other_pos + in_forest + other_vel)
-
+        return self.get_observer(world).observe(agent, world)
 
+    # observations of all agents (or those at rows) at once from entity arrays
+    # with any leading axes
+    def observation_batch(self, world, arrays, out=None, rows=None):
+        return self.get_observer(world).build(arrays, rows=rows, out=out)
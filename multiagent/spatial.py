@@ -0,0 +1,92 @@
+"""
+Neighborhood queries on agent positions. A NeighborIndex is built once from
+the positions of a world's agents (see World.neighbor_index) and answers k
+nearest neighbor and radius queries for many agents at once, with results
+padded to a fixed size and a mask of the neighbors actually found. It uses
+a KD-tree (scipy.spatial.cKDTree) when SciPy is installed, so building all
+observations costs O(N log N) instead of O(N^2), and otherwise falls back
+to brute-force distances.
+"""
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# indices of the (at most) k smallest values along the last axis, in
+# ascending order
+def k_smallest(values, k):
+    k = min(k, values.shape[-1])
+    if k < values.shape[-1]:
+        part = np.argpartition(values, k - 1, axis=-1)[..., :k]
+        order = np.argsort(np.take_along_axis(values, part, axis=-1), axis=-1, kind='stable')
+        return np.take_along_axis(part, order, axis=-1)
+    return np.argsort(values, axis=-1, kind='stable')[..., :k]
+
+# pad (..., m, kk) neighbor indices and found flags to k columns
+def pad_neighbors(index, found, k):
+    missing = k - index.shape[-1]
+    if missing > 0:
+        index = np.concatenate([index, np.zeros(index.shape[:-1] + (missing,), dtype=int)], axis=-1)
+        found = np.concatenate([found, np.zeros(found.shape[:-1] + (missing,), dtype=bool)], axis=-1)
+    return index, found
+
+class NeighborIndex(object):
+    def __init__(self, points):
+        self.points = np.array(points, dtype=float).reshape((len(points), -1))
+        # indices of the points of each queried subset, and the index over them
+        self._subsets = {}
+
+    def __len__(self):
+        return len(self.points)
+
+    # index over the points among (indices into points)
+    def _subset(self, among):
+        key = None if among is None else np.asarray(among, dtype=int).tobytes()
+        if key not in self._subsets:
+            among = np.arange(len(self.points)) if among is None else np.asarray(among, dtype=int)
+            points = self.points[among]
+            tree = cKDTree(points) if cKDTree is not None and len(points) else None
+            self._subsets[key] = (among, points, tree)
+        return self._subsets[key]
+
+    # the k nearest points (among the given indices, default all) to each of
+    # the (m, dim) queries, nearest first, optionally only those within radius
+    # and never the point exclude[i] of query i (e.g. the querying agent).
+    # Returns (m, k) indices into points (0 where missing), distances (inf
+    # where missing) and a mask of the neighbors found
+    def query(self, queries, k, radius=None, among=None, exclude=None):
+        queries = np.asarray(queries, dtype=float).reshape((-1, self.points.shape[1]))
+        among, points, tree = self._subset(among)
+        # one more candidate, in case the excluded point is among them
+        kk = min(k + (exclude is not None), len(among))
+        if kk == 0:
+            index = np.zeros((len(queries), 0), dtype=int)
+            dist = np.zeros((len(queries), 0))
+        elif tree is not None:
+            bound = np.inf if radius is None else radius
+            dist, index = tree.query(queries, k=kk, distance_upper_bound=bound)
+            dist, index = dist.reshape((len(queries), kk)), index.reshape((len(queries), kk))
+        else:
+            dist = np.sqrt(np.sum(np.square(points[None, :, :] - queries[:, None, :]), axis=-1))
+            if radius is not None:
+                dist = np.where(dist <= radius, dist, np.inf)
+            index = k_smallest(dist, kk)
+            dist = np.take_along_axis(dist, index, axis=-1)
+        found = np.isfinite(dist)
+        index = np.where(found, among[np.minimum(index, len(among) - 1)] if len(among) else index, 0)
+        if exclude is not None:
+            found &= index != np.asarray(exclude, dtype=int)[:, None]
+            # move the excluded point behind the others and drop the extra column
+            order = np.argsort(~found, axis=-1, kind='stable')[:, :min(k, kk)]
+            index, dist, found = (np.take_along_axis(a, order, axis=-1) for a in (index, dist, found))
+        dist = np.where(found, dist, np.inf)
+        index, found = pad_neighbors(np.where(found, index, 0), found, k)
+        dist = np.concatenate([dist, np.full((len(queries), k - dist.shape[1]), np.inf)], axis=-1)
+        return index, dist, found
+
+    # query() for the points at the given indices themselves, each excluding itself
+    def neighbors(self, index, k, radius=None, among=None):
+        index = np.atleast_1d(np.asarray(index, dtype=int))
+        return self.query(self.points[index], k, radius, among, exclude=index)
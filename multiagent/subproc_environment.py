@@ -0,0 +1,216 @@
+import multiprocessing
+import traceback
+from multiprocessing import shared_memory
+import gym
+import numpy as np
+from multiagent.termination import NOT_DONE
+
+# attach to an existing shared memory block owned by the parent, which
+# unlinks it on close. Workers of every start method share the resource
+# tracker of the parent, so where attaching cannot opt out of tracking
+# (Python < 3.13) the registration is left alone: unregistering it here would
+# drop the parent's own
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+def _buffers(blocks, specs):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf) for name, (shape, dtype) in specs.items()}
+
+# worker loop: owns the environments [start, stop) and writes their results
+# straight into the shared buffers, replying with a small acknowledgement only
+def _worker(conn, env_fn, start, stop, names, specs, auto_reset):
+    blocks = {name: _attach(shm_name) for name, shm_name in names.items()}
+    buffers = _buffers(blocks, specs)
+    obs, rew, done = buffers['obs'], buffers['rew'], buffers['done']
+    try:
+        envs = [env_fn() for _ in range(start, stop)]
+
+        def write_obs(j, obs_n):
+            for i, o in enumerate(obs_n):
+                if o is not None:
+                    obs[j, i, :len(o)] = o
+
+        while True:
+            cmd, data = conn.recv()
+            if cmd == 'step':
+                reset = []
+                for j, (env, action_n) in enumerate(zip(envs, data)):
+                    obs_n, reward_n, done_n, _ = env.step(action_n)
+                    rew[start + j] = reward_n
+                    done[start + j] = done_n
+                    if auto_reset and all(d != NOT_DONE for d in done_n):
+                        obs_n = env.reset()
+                        reset.append(start + j)
+                    write_obs(start + j, obs_n)
+                conn.send(('ok', reset))
+            elif cmd == 'seed':
+                for env, seed in zip(envs, data):
+                    env.seed(seed)
+                conn.send(('ok', None))
+            elif cmd == 'reset':
+                for j, env in enumerate(envs):
+                    write_obs(start + j, env.reset())
+                rew[start:stop] = 0.0
+                done[start:stop] = NOT_DONE
+                conn.send(('ok', None))
+            elif cmd == 'close':
+                conn.send(('ok', None))
+                break
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        for block in blocks.values():
+            block.close()
+        conn.close()
+
+# vectorized wrapper running num_envs copies of a MultiAgentEnv in a pool of
+# worker processes. Observations, rewards and done codes of all environments
+# are written by the workers into shared memory arrays of shape
+# (num_envs, n, obs_dim), (num_envs, n) and (num_envs, n), so the parent never
+# unpickles per-step results. Workers that die are restarted and their
+# environments reset. env_fn must be picklable for the 'spawn' start method.
+class SubprocMultiAgentEnv(gym.Env):
+    metadata = {
+        'runtime.vectorized': True,
+        'render.modes' : []
+    }
+
+    def __init__(self, env_fn, num_envs, num_workers=None, auto_reset=True, context=None):
+        self.env_fn = env_fn
+        self.num_envs = num_envs
+        self.num_workers = min(num_workers or multiprocessing.cpu_count(), num_envs)
+        self.auto_reset = auto_reset
+        self.ctx = multiprocessing.get_context(context)
+
+        # spaces come from a probe environment created in this process
+        probe = env_fn()
+        self.n = probe.n
+        self.action_space = probe.action_space
+        self.observation_space = probe.observation_space
+        obs_dim = max([space.shape[0] for space in self.observation_space])
+        del probe
+
+        self.specs = {
+            'obs': ((num_envs, self.n, obs_dim), np.float32),
+            'rew': ((num_envs, self.n), np.float64),
+            'done': ((num_envs, self.n), np.int64),
+        }
+        self.blocks = {}
+        for name, (shape, dtype) in self.specs.items():
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            self.blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+        buffers = _buffers(self.blocks, self.specs)
+        self.obs_n, self.reward_n, self.done_n = buffers['obs'], buffers['rew'], buffers['done']
+
+        bounds = np.linspace(0, num_envs, self.num_workers + 1).astype(int)
+        self.shards = list(zip(bounds[:-1], bounds[1:]))
+        self.processes = [None] * self.num_workers
+        self.conns = [None] * self.num_workers
+        for w in range(self.num_workers):
+            self._start_worker(w)
+        self.waiting = False
+        self.closed = False
+
+    def _start_worker(self, w):
+        start, stop = self.shards[w]
+        parent_conn, child_conn = self.ctx.Pipe()
+        names = {name: block.name for name, block in self.blocks.items()}
+        process = self.ctx.Process(target=_worker, args=(child_conn, self.env_fn, start, stop, names,
+                                                         self.specs, self.auto_reset))
+        process.daemon = True
+        process.start()
+        child_conn.close()
+        self.processes[w] = process
+        self.conns[w] = parent_conn
+
+    # replace a dead worker and reset its environments
+    def _restart_worker(self, w):
+        self.conns[w].close()
+        if self.processes[w].is_alive():
+            self.processes[w].terminate()
+        self.processes[w].join()
+        self._start_worker(w)
+        self.conns[w].send(('reset', None))
+        self._receive(w)
+
+    def _receive(self, w):
+        conn, process = self.conns[w], self.processes[w]
+        while not conn.poll(1.0):
+            if not process.is_alive():
+                raise EOFError
+        status, data = conn.recv()
+        if status == 'error':
+            raise RuntimeError('Worker %d failed:\n%s' % (w, data))
+        return data
+
+    # action_n[k][i] is the action of agent i in environment k
+    def step_async(self, action_n):
+        assert not self.waiting, 'step_wait() has to be called before the next step_async()'
+        for w, (start, stop) in enumerate(self.shards):
+            try:
+                self.conns[w].send(('step', [action_n[k] for k in range(start, stop)]))
+            except (BrokenPipeError, EOFError):
+                pass  # picked up as a crash in step_wait
+        self.waiting = True
+
+    # results are the shared arrays themselves and are overwritten by the next step
+    def step_wait(self):
+        info_n = {'n': [], 'reset': np.zeros(self.num_envs, dtype=bool), 'crashed': []}
+        for w, (start, stop) in enumerate(self.shards):
+            try:
+                reset = self._receive(w)
+                info_n['reset'][reset] = True
+            except (BrokenPipeError, EOFError, ConnectionResetError):
+                self._restart_worker(w)
+                info_n['crashed'].extend(range(start, stop))
+                info_n['reset'][start:stop] = True
+        self.waiting = False
+        return self.obs_n, self.reward_n, self.done_n, info_n
+
+    def step(self, action_n):
+        self.step_async(action_n)
+        return self.step_wait()
+
+    # seed every environment with an independent stream derived from seed
+    def seed(self, seed=None):
+        seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(self.num_envs)]
+        for w, (start, stop) in enumerate(self.shards):
+            self.conns[w].send(('seed', seeds[start:stop]))
+        for w in range(self.num_workers):
+            self._receive(w)
+        return [seed]
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed(seed)
+        for w in range(self.num_workers):
+            self.conns[w].send(('reset', None))
+        for w in range(self.num_workers):
+            try:
+                self._receive(w)
+            except (BrokenPipeError, EOFError, ConnectionResetError):
+                self._restart_worker(w)
+        return self.obs_n
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self.step_wait()
+        for w in range(self.num_workers):
+            try:
+                self.conns[w].send(('close', None))
+                self._receive(w)
+            except (BrokenPipeError, EOFError, ConnectionResetError):
+                pass
+            self.processes[w].join()
+            self.conns[w].close()
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.closed = True
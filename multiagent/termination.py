@@ -0,0 +1,78 @@
+"""
+Play-level termination of the passrush scenario. The outcome of the play is
+evaluated once per step for all agents (and, with leading axes, for a whole
+batch of worlds), then broadcast to per-agent done codes and final rewards.
+"""
+import numpy as np
+from multiagent.scenarios.constants import Q_BACK, OFFENSE, DEFENSE
+
+NOT_DONE = 0
+Q_BACK_FIRST_DOWN_LINE = 1
+AGENT_OUT_OF_BOUNDS = 2
+D_LINE_REACHED_Q_BACK = 3
+Q_BACK_NOT_IN_BOUNDS = 4
+Q_BACK_THREW_BALL = 5
+
+# final reward of the defense and the offense for each done code; a completed
+# throw reverses the reward of Q_BACK_THREW_BALL
+FINAL_REWARD = np.array([
+    [0, 0],         # NOT_DONE
+    [-120, 120],    # Q_BACK_FIRST_DOWN_LINE
+    [-80, -80],     # AGENT_OUT_OF_BOUNDS
+    [120, -120],    # D_LINE_REACHED_Q_BACK
+    [80, -80],      # Q_BACK_NOT_IN_BOUNDS
+    [80, -80],      # Q_BACK_THREW_BALL (incomplete)
+])
+
+# whether the world has a passrush play to terminate
+def has_play(world):
+    return len(world.roles.index(Q_BACK)) > 0
+
+class PlayTermination(object):
+    def __init__(self, world):
+        roles = world.roles
+        self.q_back = roles.index(Q_BACK)[0]
+        # defensive players that can sack the quarterback
+        self.d_line = np.concatenate([roles.index(position) for position in DEFENSE])
+        # done codes and rewards are reported for the policy agents
+        self.agents = np.array([i for i, agent in enumerate(world.agents) if agent.action_callback is None], dtype=int)
+        offense = np.zeros(len(world.agents), dtype=int)
+        for position in OFFENSE:
+            offense[roles.index(position)] = 1
+        self.offense = offense[self.agents]
+
+    # done codes of the policy agents from agent positions (..., n_agents, dim_p),
+    # sizes and in-bounds flags (..., n_agents) and the play parameters (...)
+    def done_codes(self, p_pos, size, in_bounds, time, timeout, line_of_scrimmage, first_down_line):
+        q, d = self.q_back, self.d_line
+        q_pos = p_pos[..., q, :]
+        # quarterback is past the first down line
+        past_first_down = q_pos[..., 1] > np.add(line_of_scrimmage, first_down_line)
+        # a defensive player is touching the quarterback
+        dist = np.sqrt(np.sum(np.square(p_pos[..., d, :] - q_pos[..., None, :]), axis=-1))
+        sacked = np.any(dist < size[..., d] + size[..., q, None], axis=-1)
+        play = np.select([past_first_down, ~in_bounds[..., q], sacked],
+                         [Q_BACK_FIRST_DOWN_LINE, Q_BACK_NOT_IN_BOUNDS, D_LINE_REACHED_Q_BACK], NOT_DONE)
+        done_n = np.where(in_bounds[..., self.agents], play[..., None], AGENT_OUT_OF_BOUNDS)
+        timed_out = np.asarray(np.greater(time, timeout))
+        return np.where(timed_out[..., None], Q_BACK_THREW_BALL, done_n)
+
+    # done codes of the policy agents of a single world
+    def world_done_codes(self, world):
+        if world.use_arrays:
+            arrays = world.sync_arrays()
+            n = len(world.agents)
+            p_pos, size, in_bounds = arrays.p_pos[:n], arrays.size[:n], arrays.in_bounds
+        else:
+            p_pos = np.array([agent.state.p_pos for agent in world.agents])
+            size = np.array([agent.size for agent in world.agents])
+            in_bounds = np.array([agent.in_bounds for agent in world.agents])
+        return self.done_codes(p_pos, size, in_bounds, world.time, world.timeout,
+                               world.line_of_scrimmage, world.first_down_line)
+
+    # final rewards of the policy agents for their done codes (..., n) and
+    # whether the quarterback's throw was completed (...)
+    def final_rewards(self, done_n, made_throw):
+        final = FINAL_REWARD[done_n, self.offense]
+        throw = (done_n == Q_BACK_THREW_BALL) & np.asarray(made_throw)[..., None]
+        return np.where(throw, -final, final)
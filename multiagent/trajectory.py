@@ -0,0 +1,135 @@
+"""
+Compact trajectory logs and replay. A trajectory is a directory holding
+meta.json and one raw binary file per column (positions, velocities,
+communication, done codes, play parameters, ...), each appended one row per
+logged step. Logs are cheap to write on training nodes, and a Trajectory read
+back from disk drives an environment's renderer without re-running physics
+or policies.
+"""
+import json
+import os
+import time
+import numpy as np
+from multiagent.observation import world_arrays
+
+class TrajectoryWriter(object):
+    def __init__(self, path, world, n):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        n_entities, n_agents = len(world.entities), len(world.agents)
+        self.columns = {
+            'episode': ('int32', ()),
+            'time': ('int32', ()),
+            'p_pos': ('float32', (n_entities, world.dim_p)),
+            'p_vel': ('float32', (n_entities, world.dim_p)),
+            'c': ('float32', (n_agents, world.dim_c)),
+            'done': ('int8', (n,)),
+            'line_of_scrimmage': ('float32', ()),
+            'first_down_line': ('float32', ()),
+        }
+        meta = {
+            'names': [entity.name for entity in world.entities],
+            'n_agents': n_agents,
+            'dim_p': world.dim_p,
+            'dim_c': world.dim_c,
+            'dt': world.dt,
+            'field': hasattr(world, 'first_down_line'),
+            'columns': {name: [dtype, list(shape)] for name, (dtype, shape) in self.columns.items()},
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        self.files = {name: open(os.path.join(path, name + '.bin'), 'wb') for name in self.columns}
+        self.episode = -1
+
+    # append the current state of the world; reset starts a new episode
+    def write(self, world, done_n, reset=False):
+        if reset or self.episode < 0:
+            self.episode += 1
+        arrays = world_arrays(world)
+        n_entities, n_agents = len(world.entities), len(world.agents)
+        row = {
+            'episode': self.episode,
+            'time': world.time,
+            'p_pos': arrays.p_pos[:n_entities],
+            'p_vel': arrays.p_vel[:n_entities],
+            'c': arrays.c[:n_agents],
+            'done': done_n,
+            'line_of_scrimmage': world.line_of_scrimmage,
+            'first_down_line': getattr(world, 'first_down_line', np.nan),
+        }
+        for name, (dtype, shape) in self.columns.items():
+            self.files[name].write(np.asarray(row[name], dtype=dtype).reshape(shape).tobytes())
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+# a trajectory read back from disk, with each column memory-mapped as a
+# (steps, ...) array
+class Trajectory(object):
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.columns = {}
+        for name, (dtype, shape) in self.meta['columns'].items():
+            filename = os.path.join(path, name + '.bin')
+            shape = tuple(shape)
+            if os.path.getsize(filename) == 0:
+                self.columns[name] = np.zeros((0,) + shape, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(filename, dtype=dtype, mode='r').reshape((-1,) + shape)
+        # all columns hold the same number of complete rows
+        self.steps = min(len(column) for column in self.columns.values())
+
+    def __len__(self):
+        return self.steps
+
+    def __getitem__(self, name):
+        return self.columns[name][:self.steps]
+
+    # steps [start, stop) of every logged episode
+    def episodes(self):
+        episode = self['episode']
+        bounds = np.flatnonzero(np.diff(episode)) + 1
+        starts = np.concatenate([[0], bounds])
+        stops = np.concatenate([bounds, [len(episode)]])
+        return [(int(start), int(stop)) for start, stop in zip(starts, stops) if stop > start]
+
+    # set the state of a world of the same scenario to logged step t
+    def apply(self, world, t):
+        entities = world.entities
+        assert len(entities) == len(self.meta['names']), 'trajectory was logged from a different roster'
+        p_pos, p_vel, c = self.columns['p_pos'][t], self.columns['p_vel'][t], self.columns['c'][t]
+        for i, entity in enumerate(entities):
+            entity.state.p_pos = np.array(p_pos[i], dtype=float)
+            entity.state.p_vel = np.array(p_vel[i], dtype=float)
+        for i, agent in enumerate(world.agents):
+            agent.state.c = np.array(c[i], dtype=float)
+        world.time = int(self.columns['time'][t])
+        world.line_of_scrimmage = float(self.columns['line_of_scrimmage'][t])
+        if self.meta['field']:
+            world.first_down_line = float(self.columns['first_down_line'][t])
+
+    # render steps [start, stop) through the environment's viewer, yielding what
+    # each render call returns
+    def frames(self, env, start=0, stop=None, mode='human'):
+        stop = self.steps if stop is None else min(stop, self.steps)
+        for t in range(start, stop):
+            self.apply(env.world, t)
+            if self.meta['field']:
+                yield env.render_whole_field(mode)
+            else:
+                yield env.render(mode)
+
+    # replay steps [start, stop) at speed times real time (as fast as
+    # possible if speed is None)
+    def play(self, env, speed=1.0, start=0, stop=None, mode='human'):
+        interval = self.meta['dt'] / speed if speed else 0.0
+        deadline = time.time()
+        for _ in self.frames(env, start, stop, mode):
+            deadline += interval
+            delay = deadline - time.time()
+            if delay > 0:
+                time.sleep(delay)
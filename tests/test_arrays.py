@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import multiagent.scenarios as scenarios
+from multiagent.environment import MultiAgentEnv
+
+def make_env(name, use_arrays, batch_obs=False, noise=False):
+    scenario = scenarios.load(name).Scenario()
+    world = scenario.make_world()
+    if noise:
+        # only some agents are noisy, so per-agent draws would shift the stream
+        world.agents[0].u_noise = 0.2
+        world.agents[-1].c_noise = 0.3
+    world.use_arrays = use_arrays
+    observation_batch = getattr(scenario, 'observation_batch', None) if batch_obs else None
+    env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation,
+                        observation_batch_callback=observation_batch)
+    env.seed(0)
+    return env
+
+# observations, rewards and dones of a reset and steps with random actions,
+# flattened into one array
+def rollout(env, steps=30):
+    rng = np.random.default_rng(1)
+    values = [np.concatenate(env.reset())]
+    decoder = env.action_decoder
+    for _ in range(steps):
+        action_n = [rng.random(sum(decoder.widths(agent.movable, agent.silent))) for agent in env.agents]
+        obs_n, reward_n, done_n, _ = env.step(action_n)
+        values += [np.concatenate(obs_n), np.array(reward_n, dtype=float), np.array(done_n, dtype=float)]
+    return np.concatenate(values)
+
+# the array backend (and the scenarios' batch observations) reproduce the
+# object path bit for bit
+@pytest.mark.parametrize('name', scenarios.names())
+def test_arrays_match_objects(name):
+    expected = rollout(make_env(name, use_arrays=False))
+    np.testing.assert_array_equal(rollout(make_env(name, use_arrays=True)), expected)
+    np.testing.assert_array_equal(rollout(make_env(name, use_arrays=True, batch_obs=True)), expected)
+
+# both paths draw motor and communication noise from the same stream
+def test_arrays_match_objects_with_noise():
+    expected = rollout(make_env('simple_reference', use_arrays=False, noise=True))
+    actual = rollout(make_env('simple_reference', use_arrays=True, noise=True))
+    np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import multiagent.scenarios as scenarios
+from multiagent import physics
+from multiagent.scenarios.simple_passrush import FULL_TEAMS
+
+# all pairs a < b of colliders within their sizes plus cutoff of each other
+def brute_force_pairs(p_pos, size, collide, cutoff):
+    a, b = physics.collision_pairs(collide)
+    dist = np.sqrt(np.sum(np.square(p_pos[a] - p_pos[b]), axis=-1))
+    near = dist <= size[a] + size[b] + cutoff
+    return set(zip(a[near].tolist(), b[near].tolist()))
+
+@pytest.mark.parametrize('axis', [0, 1])
+@pytest.mark.parametrize('seed', range(5))
+def test_broadphase_pairs_match_brute_force(seed, axis):
+    rng = np.random.default_rng(seed)
+    n = 200
+    p_pos = rng.uniform(0, 10, (n, 2))
+    size = rng.uniform(0.05, 0.5, n)
+    collide = rng.random(n) < 0.8
+    a, b = physics.broadphase_pairs(p_pos, size, collide, 0.3, axis)
+    pairs = list(zip(a.tolist(), b.tolist()))
+    # sorted, without duplicates
+    assert pairs == sorted(set(pairs))
+    assert set(pairs) == brute_force_pairs(p_pos, size, collide, 0.3)
+
+# with broadphase_check, every step asserts the broadphase forces equal the
+# all-pairs forces
+def test_broadphase_forces_match_all_pairs():
+    scenario = scenarios.load('simple_passrush').Scenario()
+    world = scenario.make_world(**FULL_TEAMS)
+    world.use_arrays = True
+    world.broadphase = True
+    world.broadphase_check = True
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        for agent in world.agents:
+            agent.action.u = rng.uniform(-1, 1, world.dim_p)
+        world.step()
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import multiagent.scenarios as scenarios
+from multiagent.environment import MultiAgentEnv
+
+def make_env(name, use_arrays):
+    scenario = scenarios.load(name).Scenario()
+    world = scenario.make_world()
+    world.use_arrays = use_arrays
+    env = MultiAgentEnv(world, scenario.reset_world, scenario.reward, scenario.observation)
+    env.seed(0)
+    env.reset()
+    return env
+
+def run(env, actions):
+    return [np.concatenate(env.step(action_n)[0]) for action_n in actions]
+
+# restoring a snapshot reproduces the snapshot and every later step,
+# including the random draws of noise and the play outcome
+@pytest.mark.parametrize('use_arrays', [False, True])
+@pytest.mark.parametrize('name', ['simple_passrush', 'simple_speaker_listener'])
+def test_state_round_trip(name, use_arrays):
+    env = make_env(name, use_arrays)
+    for agent in env.world.agents:
+        agent.u_noise = 0.1
+    env.world.invalidate_arrays()
+    rng = np.random.default_rng(1)
+    decoder = env.action_decoder
+    actions = [[rng.random(sum(decoder.widths(agent.movable, agent.silent))) for agent in env.agents]
+               for _ in range(15)]
+    run(env, actions[:5])
+    state = env.get_state()
+    expected = run(env, actions[5:])
+    env.set_state(state)
+    np.testing.assert_array_equal(env.get_state(), state)
+    actual = run(env, actions[5:])
+    for a, b in zip(actual, expected):
+        np.testing.assert_array_equal(a, b)